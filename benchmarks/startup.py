@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the command line interface.
+
+Measures, in fresh interpreters, how long it takes to import the CLI module
+(everything that runs before the banner is printed), and checks that none of
+the heavy dependencies are loaded at that point. Exits with an error if the
+best time is over the budget, or if a heavy module was imported.
+
+    python benchmarks/startup.py [--repeat N] [--budget MS]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Import time budget for telescope_planner.__main__, in milliseconds:
+STARTUP_BUDGET_MS = 50.0
+
+HEAVY_MODULES = ['numpy', 'skyfield', 'pyongc', 'pytz', 'geocoder', 'astropy', 'requests']
+
+PROBE = f"""
+import json, sys, time
+t = time.perf_counter()
+import telescope_planner.__main__
+elapsed = (time.perf_counter() - t) * 1000.0
+loaded = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+print(json.dumps({{'elapsed_ms': elapsed, 'heavy_modules': loaded}}))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(repeat):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout
+        runs.append(json.loads(output))
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_MS, help='budget, in milliseconds')
+    args = parser.parse_args()
+
+    runs = measure(args.repeat)
+    best = min(run['elapsed_ms'] for run in runs)
+    heavy = sorted({name for run in runs for name in run['heavy_modules']})
+
+    print(f'telescope_planner.__main__ import: best {best:.1f} ms of {args.repeat} runs '
+          f'(budget: {args.budget:.0f} ms)')
+    if heavy:
+        print(f'Heavy modules imported at startup: {", ".join(heavy)}')
+    if best > args.budget or heavy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
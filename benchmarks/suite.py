@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the main session paths, at several selection sizes.
+
+Times get_dso_list, Session construction, update_now_solar_objects,
+update_now_deepspace_objects, generate_session_list and the command line
+interface end to end, for selections of 100, 1000 objects and the full
+catalog. The session clock is pinned (PINNED_UTC, see clock.FixedClock) and the location is the default
+one, and the visibility stores are never used (whether one was built for
+that location or not), so results only change with the code, and
+everything runs offline with the ephemeris and catalog snapshot in the data
+folder.
+
+Results are printed (or written) as JSON:
+
+    python benchmarks/suite.py [--repeat N] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PINNED_UTC = (2026, 10, 25, 22, 0)
+SESSION_HOURS = 8
+SIZES = {'100': 100, '1000': 1000, 'full': None}
+
+# Runs the CLI in a fresh interpreter, with the shared timescale pinned:
+CLI_PROBE = f"""
+import contextlib, io, logging, time
+t = time.perf_counter()
+from telescope_planner.ephemeris import get_timescale
+ts = get_timescale()
+pinned = ts.utc(*{PINNED_UTC!r})
+ts.now = lambda: pinned
+import telescope_planner.session
+telescope_planner.session.get_store = lambda *args, **kwargs: None
+import telescope_planner.__main__ as cli
+logging.disable(logging.CRITICAL)
+with contextlib.redirect_stdout(io.StringIO()):
+    cli.main()
+print(time.perf_counter() - t)
+"""
+
+
+def pinned_timescale():
+    from telescope_planner.ephemeris import get_timescale
+
+    ts = get_timescale()
+    return ts, ts.utc(*PINNED_UTC)
+
+
+def timed(function, repeat):
+    """Run function repeat times, returning the timings (seconds) and the last result."""
+    timings, result = [], None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - t)
+    return timings, result
+
+
+def record(results, name, size, timings, count=None):
+    results.append({'name': name,
+                    'size': size,
+                    'objects': count,
+                    'first_s': round(timings[0], 6),
+                    'best_s': round(min(timings), 6),
+                    'median_s': round(statistics.median(timings), 6),
+                    'runs': len(timings),
+                    })
+    print(f'{name:30} {size:>5} {min(timings) * 1000:10.1f} ms', file=sys.stderr)
+
+
+def run(repeat):
+    from telescope_planner.catalog import get_catalog
+    from telescope_planner.clock import FixedClock
+    from telescope_planner.session import Session, get_dso_list
+
+    ts, pinned = pinned_timescale()
+    end = ts.tt_jd(pinned.tt + SESSION_HOURS / 24.0)
+    catalog = get_catalog()
+    results = []
+
+    for size, limit in SIZES.items():
+        timings, rows = timed(lambda: get_dso_list(limit=limit, snapshot=catalog), repeat)
+        record(results, 'get_dso_list', size, timings, len(rows))
+
+        def new_session():
+            return Session(timescale=ts, start=pinned, end=end, limit=limit, clock=FixedClock(pinned),
+                           use_store=False)
+
+        timings, session = timed(new_session, repeat)
+        record(results, 'Session', size, timings, len(session.deepspace_selection))
+        timings, _ = timed(session.update_now_solar_objects, repeat)
+        record(results, 'update_now_solar_objects', size, timings, len(session.solar_system))
+        timings, _ = timed(session.update_now_deepspace_objects, repeat)
+        record(results, 'update_now_deepspace_objects', size, timings, len(session.deepspace_selection))
+        timings, _ = timed(session.generate_session_list, repeat)
+        record(results, 'generate_session_list', size, timings, len(session.deepspace_selection))
+
+    timings = [float(subprocess.run([sys.executable, '-c', CLI_PROBE], cwd=ROOT, check=True,
+                                    capture_output=True, text=True).stdout)
+               for _ in range(repeat)]
+    record(results, 'cli', 'cli', timings)
+    return results
+
+
+def environment():
+    import numpy
+    import skyfield
+
+    import telescope_planner
+
+    return {'telescope_planner': telescope_planner.__version__,
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'skyfield': skyfield.__version__,
+            'machine': platform.machine(),
+            'pinned_utc': '{:04d}-{:02d}-{:02d}T{:02d}:{:02d}Z'.format(*PINNED_UTC),
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='JSON file for the results (default: standard output)')
+    args = parser.parse_args()
+
+    report = {'environment': environment(), 'results': run(args.repeat)}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+
+
+if __name__ == "__main__":
+    main()
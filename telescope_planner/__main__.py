@@ -14,17 +14,21 @@ import sys
 from pprint import pformat
 from types import SimpleNamespace
 
-from skyfield.api import Loader
-from pytz import timezone
-
 from telescope_planner.constants import OUR_TOP_LIST_PLANETS, OUR_TOP_LIST_DEEPSPACE
 from telescope_planner.constants import DEFAULT_LOCATION, CONSTELLATIONS_LATIN_FROM_ABBREV
-from telescope_planner.settings import DATA_FOLDER, DEFAULT_MIN_MAG, NAKED_EYE_MAG
+from telescope_planner.settings import DEFAULT_MIN_MAG, NAKED_EYE_MAG, TIMINGS_FILE
 from telescope_planner.geocode import get_location
-from telescope_planner.session import Session
+
+# NOTE: The heavier dependencies (skyfield, numpy, pyongc, pytz, geocoder) are
+# only imported when the code that needs them runs, so that the banner and
+# the location show up right away. See benchmarks/startup.py.
 
 
 def main():
+    if sys.argv[1:2] == ['batch']:
+        from telescope_planner.batch import main as batch_main
+        return batch_main(sys.argv[2:])
+
     logging.basicConfig(level=logging.DEBUG,
                         datefmt='%Y-%b-%d %H:%M:%S',
                         format='%(asctime)s %(levelname)s P%(process)d T%(thread)d %(filename)s L%(lineno)d %(funcName)s() - %(message)s %(relativeCreated)d ms')
@@ -35,11 +39,6 @@ def main():
 
     # location, source = get_location()
     location, source = DEFAULT_LOCATION, "DEBUG method"
-    load = Loader(DATA_FOLDER)
-    ts = load.timescale()
-    # now = ts.utc(2019, 3, 29, 1, 39)
-    now = ts.now()
-    tz = timezone('Europe/Lisbon')
 
     print(f'\nBased on the {source}, this is your current location:\n')
     print(f'  {location.dms_latitude} {location.dms_longitude}')
@@ -51,6 +50,16 @@ def main():
         print(f'  Alt.: {location.altitude:.0f}m\n')
         altitude = location.altitude
 
+    from pytz import timezone
+
+    from telescope_planner.ephemeris import get_timescale
+    from telescope_planner.observers import PlanetObserver
+    from telescope_planner.session import Session
+
+    ts = get_timescale()
+    # now = ts.utc(2019, 3, 29, 1, 39)
+    now = ts.now()
+    tz = timezone('Europe/Lisbon')
 
     # TODO: The sources variable can be initialized with a list of Messier IDs, for instance
     sources = SimpleNamespace(**{'planets': OUR_TOP_LIST_PLANETS,
@@ -80,32 +89,39 @@ def main():
 
     logging.debug("New session")
 
-    session = Session(**session_params)
+    session = Session(stream=True, instrument=True, **session_params)
     logging.debug("Finalized Session initialization. Starting report generation.")
     print('Here are some interesting objects up in the sky right now:')
     print('\n  Solar system:'.upper())
 
-    if session.objects_visible_now.planets:
-        for obj in session.objects_visible_now.planets:
-            obj.update_coords()
+    # Objects are printed as soon as each batch is computed, brightest first:
+    deepspace_found = 0
+    for obj in session.iter_visible():
+        if isinstance(obj, PlanetObserver):
             # print(obj.name, obj.alt, obj.az, obj.distance)
             print(f'   • {obj.name.ljust(17)} Alt: {obj.alt.degrees:8.4f} Az: {obj.az.degrees:8.4f}, D: {obj.distance.au:15.1f}au - {obj.kind}')
-    else:
-        print('[Nothing to show here]')
-
-    print('\n  Deep space objects:'.upper())
-    logging.debug("Starting deep space report generation.")
-    if session.objects_visible_now.deepspace:
-        for obj in session.objects_visible_now.deepspace:
-            obj.update_coords()
-            # print(obj.name, obj.alt, obj.az, obj.distance)
-            print(f'   • {obj.name.ljust(17)}    Alt: {obj.alt.degrees:8.4f} Az: {obj.az.degrees:8.4f} - {obj.kind} in {CONSTELLATIONS_LATIN_FROM_ABBREV[obj.constellation]}')
+            continue
+        if not deepspace_found:
+            if not session.objects_visible_now.planets:
+                print('[Nothing to show here]')
+            print('\n  Deep space objects:'.upper())
+            logging.debug("Starting deep space report generation.")
+        deepspace_found += 1
+        print(f'   • {obj.name.ljust(17)}    Alt: {obj.alt.degrees:8.4f} Az: {obj.az.degrees:8.4f} - {obj.kind} in {CONSTELLATIONS_LATIN_FROM_ABBREV[obj.constellation]} (score: {obj.score:.2f})')
+
+    if deepspace_found:
         print('\n  ', len(session.objects_visible_now.deepspace), "objects visible from a total of",
               len(session.deepspace_selection), "objects analyzed.")
     else:
+        if not session.objects_visible_now.planets:
+            print('[Nothing to show here]')
+        print('\n  Deep space objects:'.upper())
         print('   • [Nothing to show here]')
 
     logging.debug("Finalized report presentation.")
+    logging.debug(pformat(session.timings))
+    if TIMINGS_FILE:
+        session.write_timings(TIMINGS_FILE)
     print('\n')
 
 
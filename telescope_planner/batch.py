@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Batch mode: run many session specs, read from a JSONL or CSV file, and
+stream one JSON result per spec, in the same order.
+
+    python -m telescope_planner batch specs.jsonl [-o results.jsonl] [-w WORKERS]
+
+Each spec is a JSON object (or a CSV row) with the site (latitude, longitude
+and, optionally, altitude, city and country; DEFAULT_LOCATION if not given),
+the time window (start and end, as ISO 8601 UTC dates, by default the
+current or next night), the number of best objects to report (top), an
+optional id, and any other Session parameter (constellation, only_kind,
+min_apparent_mag, min_alt, bookmarks...). Results are multisite.plan_site
+reports, plus the spec id, or an error message for the specs that fail.
+
+The catalog snapshot and the ephemeris kernel are loaded once per process
+(once in each worker, with workers), and shared by all its specs.
+"""
+import argparse
+import csv
+import json
+import logging
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from telescope_planner.constants import DEFAULT_LOCATION
+from telescope_planner.settings import CATALOG_FOLDER, EPHEMERIS_FILE
+
+SITE_FIELDS = ('city', 'country', 'latitude', 'longitude', 'altitude')
+
+# Specs submitted ahead to each worker, so that none of them waits for input,
+# while the rest of the file is still only read as needed:
+SPECS_PER_WORKER = 2
+
+
+def _csv_value(text):
+    """Typed value for a CSV cell: None (empty), a number, a JSON list, or the text itself."""
+    text = text.strip()
+    if not text:
+        return None
+    if text.startswith('['):
+        return json.loads(text)
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+
+def read_specs(lines, csv_format=False):
+    """ Yield the specs (dicts) from an iterable of lines: JSONL (blank lines
+    and lines starting with # are skipped), or CSV with a header row (empty
+    cells are left out)."""
+    if csv_format:
+        for row in csv.DictReader(lines):
+            yield {key.strip(): _csv_value(value) for key, value in row.items()
+                   if key and value is not None and value.strip()}
+        return
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield json.loads(line)
+
+
+def _check_site(site):
+    """Raise ValueError for a site latitude or longitude that is missing or out of range."""
+    for field, limit in (('latitude', 90.0), ('longitude', 180.0)):
+        value = site[field]
+        if value is None:
+            raise ValueError(f'Missing {field}')
+        if not -limit <= float(value) <= limit:
+            raise ValueError(f'{field.capitalize()} out of range: {value}')
+
+
+def _tt_jd(ts, text):
+    if text is None:
+        return None
+    moment = datetime.fromisoformat(str(text).replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return ts.from_datetime(moment).tt
+
+
+def run_spec(spec, number=None, top=None):
+    """ Run one spec, returning its report (see multisite.plan_site) with an
+    id (the spec one, or its number), or the id and an error message."""
+    from telescope_planner.ephemeris import get_timescale
+    from telescope_planner.multisite import TOP_OBJECTS, plan_site
+
+    spec = dict(spec)
+    spec_id = spec.pop('id', number)
+    try:
+        default = DEFAULT_LOCATION if 'latitude' not in spec and 'longitude' not in spec else None
+        site = {field: spec.pop(field, getattr(default, field, None)) for field in SITE_FIELDS}
+        _check_site(site)
+        ts = get_timescale()
+        start, end = _tt_jd(ts, spec.pop('start', None)), _tt_jd(ts, spec.pop('end', None))
+        count = spec.pop('top', None) or top or TOP_OBJECTS
+        report = plan_site(site, start, end, count, spec)
+    except Exception as e:
+        logging.warning(f'Spec {spec_id}: {e}')
+        return {'id': spec_id, 'error': f'{e.__class__.__name__}: {e}'}
+    return {'id': spec_id, **report}
+
+
+def _run_spec_job(job):
+    return run_spec(*job)
+
+
+def run_batch(specs, workers=1, top=None):
+    """ Yield the results of the specs (any iterable of dicts), in order, as
+    soon as each one is ready. With more than one worker, specs are run in a
+    process pool, a few at a time, so that the input is still streamed."""
+    from telescope_planner.catalog import get_catalog
+    from telescope_planner.ephemeris import get_ephemeris
+    from telescope_planner.multisite import _init_worker
+
+    jobs = ((spec, number, top) for number, spec in enumerate(specs, 1))
+    get_catalog(CATALOG_FOLDER)
+    get_ephemeris(EPHEMERIS_FILE)
+
+    if workers <= 1:
+        for job in jobs:
+            yield _run_spec_job(job)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(CATALOG_FOLDER, EPHEMERIS_FILE)) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(_run_spec_job, job))
+            if len(pending) >= workers * SPECS_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m telescope_planner batch',
+                                     description='Run the session specs in a JSONL or CSV file.')
+    parser.add_argument('specs', help='JSONL or CSV (.csv) file with one spec per line/row, or - for stdin')
+    parser.add_argument('-o', '--output', help='JSONL file for the results (default: standard output)')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='worker processes (default: 1)')
+    parser.add_argument('--csv', action='store_true', help='read the specs as CSV (default for .csv files)')
+    parser.add_argument('--top', type=int, help='best objects per spec, unless the spec sets it')
+    args = parser.parse_args(argv)
+
+    specs_file = sys.stdin if args.specs == '-' else open(args.specs, newline='')
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        specs = read_specs(specs_file, args.csv or args.specs.lower().endswith('.csv'))
+        for result in run_batch(specs, args.workers, args.top):
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+    finally:
+        if specs_file is not sys.stdin:
+            specs_file.close()
+        if output is not sys.stdout:
+            output.close()
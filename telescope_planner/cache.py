@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Result cache for sessions, for running the planner as a service.
+
+Users close to each other, asking about the same few minutes with the same
+filters, get the same answer: requests are keyed by their location rounded
+to a grid, their altitude band, their time bucket and their session filters,
+and each key is computed only once, until it is evicted (least recently used
+first, once the cache is full) or expires (after max_age seconds).
+
+Results are shared between callers, so they must be treated as read-only.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+CACHE_MAX_SIZE = 256
+CACHE_MAX_AGE_SECONDS = 600.0
+
+# Requests are grouped by location (degrees), altitude (meters) and time (minutes):
+CACHE_GRID_DEGREES = 0.05
+CACHE_ALTITUDE_BAND_METERS = 250.0
+CACHE_TIME_BUCKET_MINUTES = 5.0
+
+# Session parameters that are part of the key, besides location and time:
+FILTERS = ('constellation', 'only_kind', 'min_apparent_mag', 'only_from_catalog', 'limit')
+
+
+def _hashable(value):
+    if hasattr(value, 'tt'):  # skyfield Time
+        return float(value.tt)
+    if isinstance(value, SimpleNamespace):
+        value = vars(value)
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_hashable(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    return value
+
+
+class SessionCache:
+    """ LRU cache with a maximum size and age, and hit/miss counters. See
+    key() for how requests are grouped, and session() for cached sessions."""
+
+    def __init__(self, max_size=CACHE_MAX_SIZE, max_age=CACHE_MAX_AGE_SECONDS, grid_degrees=CACHE_GRID_DEGREES,
+                 altitude_band=CACHE_ALTITUDE_BAND_METERS, time_bucket_minutes=CACHE_TIME_BUCKET_MINUTES):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.grid = grid_degrees
+        self.altitude_band = altitude_band
+        self.time_bucket = time_bucket_minutes / 1440.0
+        self.entries = OrderedDict()  # key -> (creation time, result)
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self._lock = threading.RLock()
+
+    def quantize(self, latitude, longitude, altitude=0.0, jd=None):
+        """ Representative location (grid point, middle of the altitude band)
+        and time (start of the bucket, as a TT Julian date) for a request."""
+        latitude = round(round(latitude / self.grid) * self.grid, 6)
+        longitude = round((round(longitude / self.grid) * self.grid + 180.0) % 360.0 - 180.0, 6)
+        altitude = (math.floor((altitude or 0.0) / self.altitude_band) + 0.5) * self.altitude_band
+        bucket = None if jd is None else math.floor(jd / self.time_bucket) * self.time_bucket
+        return latitude, longitude, altitude, bucket
+
+    def key(self, latitude, longitude, altitude=0.0, jd=None, **params):
+        """ Cache key for a request: the quantized location and time, the
+        FILTERS values (None when not given) and any other parameters."""
+        filters = tuple(_hashable(params.pop(name, None)) for name in FILTERS)
+        return self.quantize(latitude, longitude, altitude, jd) + filters + _hashable(params)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.max_age:
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, result):
+        with self._lock:
+            self.entries[key] = (time.monotonic(), result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """ The cached result for key, or compute() (called without the lock
+        held, so two first requests for the same key may both compute it)."""
+        missing = object()
+        result = self.get(key, missing)
+        if result is missing:
+            result = compute()
+            self.put(key, result)
+        return result
+
+    def session(self, latitude, longitude, altitude=0.0, t=None, **params):
+        """ A Session for the request location, at time t (a skyfield Time,
+        by default now), with the given Session parameters, and its current
+        Solar System and deep space positions already updated.
+
+        Sessions are created for the representative location and time of
+        their key (see quantize), with a FixedClock (so params can not
+        include a clock), and their results are at most one time bucket,
+        half a grid step and half an altitude band away from the request.
+        """
+        from telescope_planner.clock import FixedClock
+        from telescope_planner.ephemeris import get_timescale
+        from telescope_planner.session import Session
+
+        if 'clock' in params:
+            raise ValueError('Cached sessions use their own clock, pinned to their time bucket')
+        ts = params.get('timescale') or get_timescale()
+        t = t if t is not None else ts.now()
+        key = self.key(latitude, longitude, altitude, t.tt, **{k: v for k, v in params.items() if k != 'timescale'})
+
+        def new_session():
+            lat, lon, alt, bucket = key[0:4]
+            session = Session(latitude=lat, longitude=lon, altitude=alt, clock=FixedClock(bucket),
+                              **dict(params, timescale=ts))
+            session.update_now_solar_objects()
+            session.update_now_deepspace_objects()
+            return session
+
+        return self.get_or_compute(key, new_session)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {'size': len(self.entries),
+                    'max_size': self.max_size,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'expirations': self.expirations,
+                    'hit_rate': self.hits / requests if requests else 0.0,
+                    }
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Columnar snapshot of the OpenNGC catalog.
+
+The pyongc database is turned, in a one-time build step, into a folder of
+plain NumPy files (one per column), that are then memory-mapped by the session
+layer. Coordinates, magnitudes and sizes are stored as float arrays, object
+types and constellations as small integer codes, and the object names as a
+single fixed-width string table. Sorted orders (by V magnitude and by
+declination) and per-type/per-constellation row lists are stored alongside,
+so that queries run as index range scans instead of full column scans.
+
+To (re)build the snapshot by hand:
+
+    python -m telescope_planner.catalog
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+
+import numpy as np
+
+from telescope_planner.positions import sexagesimal_to_decimal
+from telescope_planner.settings import CATALOG_FOLDER
+
+SNAPSHOT_FORMAT = 2
+
+CATALOG_NAMES = ['NGC', 'IC']
+
+COLUMNS = {
+    'ra_hours': 'f8',
+    'dec_degrees': 'f8',
+    'bmag': 'f8',
+    'vmag': 'f8',
+    'majax': 'f4',
+    'minax': 'f4',
+    'surface_brightness': 'f4',
+    'type': 'i1',
+    'constellation': 'i1',
+    'catalog': 'i1',
+    'messier': 'i2',
+    'dup_of': 'i4',
+}
+
+SORTED_INDEXES = ['vmag', 'dec_degrees']
+CODE_INDEXES = ['type', 'constellation']
+INDEX_FILES = ([f'{kind}_{col}' for col in SORTED_INDEXES for kind in ('order', 'sorted')]
+               + [name for col in CODE_INDEXES for name in (f'rows_by_{col}', f'{col}_start')])
+
+_catalog = None
+
+
+def _parse_coord(text):
+    if not text:
+        return np.nan
+    return sexagesimal_to_decimal(text.split(':'))
+
+
+def _to_float(value):
+    return np.nan if value is None else float(value)
+
+
+def normalize_name(name):
+    """ Convert an object name to the form used in the OpenNGC database,
+    e.g. 'ngc 104' -> 'NGC0104', 'IC 1613A' -> 'IC1613A'.
+    """
+    parts = re.match(r'^((?:NGC|IC)\s?)(\d{1,4})\s?((NED)(\d{1,2})|[A-Z]{1,2})?$', name.strip().upper())
+    if parts is None:
+        raise ValueError(f'Wrong object name: {name}. Please insert a valid NGC or IC object name.')
+    prefix, number = parts.group(1).strip(), f'{int(parts.group(2)):04d}'
+    if parts.group(4) is not None:
+        return f'{prefix}{number} NED{int(parts.group(5)):02d}'
+    return f'{prefix}{number}{(parts.group(3) or "").strip()}'
+
+
+def build_snapshot(folder=CATALOG_FOLDER):
+    """ Read the whole pyongc database in one query and write it as a columnar
+    snapshot in the given folder.
+    """
+    from pyongc import ongc
+
+    folder = os.path.expanduser(folder)
+    os.makedirs(folder, exist_ok=True)
+
+    db = sqlite3.connect(f'file:{ongc.DBPATH}?mode=ro', uri=True)
+    try:
+        types = db.execute('SELECT type, typedesc FROM objTypes ORDER BY rowid').fetchall()
+        rows = db.execute('SELECT name, type, ra, dec, const, majax, minax, bmag, vmag, sbrightn, '
+                          'messier, ngc, ic FROM objects ORDER BY name').fetchall()
+    finally:
+        db.close()
+
+    type_codes = {abbrev: i for i, (abbrev, _) in enumerate(types)}
+    constellations = sorted({row[4] for row in rows})
+    constellation_codes = {const: i for i, const in enumerate(constellations)}
+    names = [row[0] for row in rows]
+    index_of = {name: i for i, name in enumerate(names)}
+
+    columns = {col: np.empty(len(rows), dtype=dtype) for col, dtype in COLUMNS.items()}
+    for i, (name, kind, ra, dec, const, majax, minax, bmag, vmag, sbrightn, messier, ngc, ic) in enumerate(rows):
+        columns['ra_hours'][i] = _parse_coord(ra)
+        columns['dec_degrees'][i] = _parse_coord(dec)
+        columns['majax'][i] = _to_float(majax)
+        columns['minax'][i] = _to_float(minax)
+        columns['bmag'][i] = _to_float(bmag)
+        columns['vmag'][i] = _to_float(vmag)
+        columns['surface_brightness'][i] = _to_float(sbrightn)
+        columns['type'][i] = type_codes[kind]
+        columns['constellation'][i] = constellation_codes[const]
+        columns['catalog'][i] = 0 if name.startswith('NGC') else 1
+        columns['messier'][i] = int(messier) if messier else 0
+        columns['dup_of'][i] = -1
+        if kind == 'Dup':
+            target = f'NGC{ngc}' if ngc else f'IC{ic}'
+            columns['dup_of'][i] = index_of.get(target, -1)
+
+    for col, values in columns.items():
+        np.save(os.path.join(folder, f'{col}.npy'), values)
+
+    # Indexes: sorted orders for range scans, and row lists for the small-int
+    # codes (all rows of code k are rows_by_X[X_start[k]:X_start[k + 1]]).
+    for col in SORTED_INDEXES:
+        order = np.argsort(columns[col], kind='stable')  # NaN values go last
+        np.save(os.path.join(folder, f'order_{col}.npy'), order)
+        np.save(os.path.join(folder, f'sorted_{col}.npy'), columns[col][order])
+    for col in CODE_INDEXES:
+        n_codes = len(types) if col == 'type' else len(constellations)
+        order = np.argsort(columns[col], kind='stable')
+        np.save(os.path.join(folder, f'rows_by_{col}.npy'), order)
+        np.save(os.path.join(folder, f'{col}_start.npy'), np.searchsorted(columns[col][order], np.arange(n_codes + 1)))
+    np.save(os.path.join(folder, 'names.npy'), np.array(names, dtype='U'))
+
+    meta = {'format': SNAPSHOT_FORMAT,
+            'pyongc_version': ongc.__version__,
+            'db_date': ongc.DBDATE,
+            'count': len(rows),
+            'type_abbrevs': [abbrev for abbrev, _ in types],
+            'type_names': [desc for _, desc in types],
+            'constellations': constellations,
+            }
+    with open(os.path.join(folder, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+    logging.debug(f"Built catalog snapshot with {len(rows)} objects in {folder}")
+    return folder
+
+
+class CatalogSnapshot:
+    """ Read-only, memory-mapped view of a columnar catalog snapshot. Each
+    column is available as an attribute (e.g. catalog.ra_hours, catalog.vmag).
+    """
+
+    def __init__(self, folder=CATALOG_FOLDER):
+        self.folder = os.path.expanduser(folder)
+        with open(os.path.join(self.folder, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f'Unsupported catalog snapshot format in {self.folder}')
+
+        for col in COLUMNS:
+            setattr(self, col, np.load(os.path.join(self.folder, f'{col}.npy'), mmap_mode='r'))
+        self.names = np.load(os.path.join(self.folder, 'names.npy'), mmap_mode='r')
+        self.indexes = {name: np.load(os.path.join(self.folder, f'{name}.npy'), mmap_mode='r')
+                        for name in INDEX_FILES}
+
+        self.type_names = self.meta['type_names']
+        self.type_abbrevs = self.meta['type_abbrevs']
+        self.constellations = self.meta['constellations']
+        self._index_of = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def name(self, index):
+        return str(self.names[index])
+
+    def type_name(self, index):
+        return self.type_names[self.type[index]]
+
+    def constellation_abbrev(self, index):
+        return self.constellations[self.constellation[index]]
+
+    def messier_name(self, index):
+        number = int(self.messier[index])
+        return f'M{number:03d}' if number else None
+
+    def type_code(self, kind):
+        """Code for an object type, given either as a name or an abbreviation."""
+        if kind in self.type_names:
+            return self.type_names.index(kind)
+        if kind in self.type_abbrevs:
+            return self.type_abbrevs.index(kind)
+        return None
+
+    def constellation_code(self, constellation):
+        if constellation in self.constellations:
+            return self.constellations.index(constellation)
+        return None
+
+    def index_of(self, name):
+        """ Find the row index for an object name (NGC, IC or Messier).
+        Duplicated records are resolved to their main object, like pyongc does.
+        """
+        if self._index_of is None:
+            self._index_of = {str(n): i for i, n in enumerate(self.names)}
+
+        messier = re.match(r'^M\s?(\d{1,3})$', name.strip().upper())
+        if messier is not None:
+            rows = np.flatnonzero((self.messier == int(messier.group(1))) & (self.dup_of < 0))
+            if not len(rows):
+                raise ValueError(f'Object named {name} not found in the catalog.')
+            return int(rows[0])
+
+        normalized = normalize_name(name)
+        if normalized not in self._index_of:
+            raise ValueError(f'Object named {normalized} not found in the catalog.')
+        index = self._index_of[normalized]
+        return int(self.dup_of[index]) if self.dup_of[index] >= 0 else index
+
+
+    def _range(self, col, lower=None, upper=None):
+        """Rows with lower <= col <= upper, from the sorted index of col."""
+        values = self.indexes[f'sorted_{col}']
+        start = 0 if lower is None else np.searchsorted(values, lower, side='left')
+        stop = np.searchsorted(values, np.inf if upper is None else upper, side='right')
+        return self.indexes[f'order_{col}'][start:stop]
+
+    def _rows_with_code(self, col, code):
+        start = self.indexes[f'{col}_start']
+        return self.indexes[f'rows_by_{col}'][start[code]:start[code + 1]]
+
+    def query(self, catalog=None, type_code=None, constellation_code=None, uptovmag=None,
+              min_ra=None, max_ra=None, min_dec=None, max_dec=None, subset=None, limit=None):
+        """ Row indices for the objects matching all the given predicates,
+        brightest first, with limit applied after filtering.
+
+        The scan starts from the most selective index (type, constellation,
+        magnitude or declination range, or the given subset), and only the
+        remaining rows are checked against the other predicates. A right
+        ascension range (in hours) wraps around 0h when min_ra > max_ra.
+        Duplicated records and objects without coordinates are left out.
+        """
+        scans = []
+        if subset is not None:
+            scans.append(np.asarray(subset, dtype=int))
+        if type_code is not None:
+            scans.append(self._rows_with_code('type', type_code))
+        if constellation_code is not None:
+            scans.append(self._rows_with_code('constellation', constellation_code))
+        if uptovmag is not None:
+            scans.append(self._range('vmag', upper=uptovmag))
+        if min_dec is not None or max_dec is not None:
+            scans.append(self._range('dec_degrees', min_dec, max_dec))
+        rows = min(scans, key=len) if scans else np.arange(len(self))
+
+        dec, ra = self.dec_degrees[rows], self.ra_hours[rows]
+        mask = (self.dup_of[rows] < 0) & ~np.isnan(ra)
+        if subset is not None:
+            mask &= np.isin(rows, subset)
+        if type_code is not None:
+            mask &= self.type[rows] == type_code
+        if constellation_code is not None:
+            mask &= self.constellation[rows] == constellation_code
+        if uptovmag is not None:
+            mask &= self.vmag[rows] <= uptovmag
+        if min_dec is not None:
+            mask &= dec >= min_dec
+        if max_dec is not None:
+            mask &= dec <= max_dec
+        if min_ra is not None and max_ra is not None and min_ra > max_ra:
+            mask &= (ra >= min_ra) | (ra <= max_ra)
+        else:
+            if min_ra is not None:
+                mask &= ra >= min_ra
+            if max_ra is not None:
+                mask &= ra <= max_ra
+        if catalog == 'M':
+            mask &= self.messier[rows] > 0
+        elif catalog is not None:
+            mask &= self.catalog[rows] == CATALOG_NAMES.index(catalog)
+
+        rows = rows[mask]
+        return rows[np.argsort(self.vmag[rows], kind='stable')][0:limit]
+
+
+def get_catalog(folder=CATALOG_FOLDER):
+    """ Return the process-wide catalog snapshot, building it first if it
+    does not exist yet.
+    """
+    global _catalog
+    if _catalog is None or _catalog.folder != os.path.expanduser(folder):
+        try:
+            _catalog = CatalogSnapshot(folder)
+        except (OSError, ValueError) as e:
+            logging.info(f"Building a new catalog snapshot ({e})")
+            build_snapshot(folder)
+            _catalog = CatalogSnapshot(folder)
+    return _catalog
+
+
+if __name__ == "__main__":
+    print(f'Catalog snapshot written to {build_snapshot()}')
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Clocks for sessions: where "now" comes from.
+
+A session asks its clock for the current time (see Session.now), instead of
+reading the wall clock directly, so that runs can be pinned to a given time
+(FixedClock), or played faster than real time (SimulatedClock). Every clock
+returns skyfield Time objects from the session timescale.
+"""
+import time
+
+
+def _tt_jd(t):
+    """TT Julian date of a skyfield Time, or of a number that already is one."""
+    return float(getattr(t, 'tt', t))
+
+
+class SystemClock:
+    """The wall clock (the default)."""
+
+    def now(self, ts):
+        return ts.now()
+
+
+class FixedClock:
+    """ Always the same time (a skyfield Time or a TT Julian date), until
+    set() or advance() move it."""
+
+    def __init__(self, t):
+        self.jd = _tt_jd(t)
+
+    def now(self, ts):
+        return ts.tt_jd(self.jd)
+
+    def set(self, t):
+        self.jd = _tt_jd(t)
+
+    def advance(self, seconds):
+        self.jd += seconds / 86400.0
+
+
+class SimulatedClock:
+    """ Starts at a given time (a skyfield Time or a TT Julian date), and
+    runs speed times faster than the wall clock (e.g. 60 for one simulated
+    minute per second)."""
+
+    def __init__(self, start, speed=1.0):
+        self.speed = speed
+        self.set(start)
+
+    def now(self, ts):
+        return ts.tt_jd(self.jd())
+
+    def jd(self):
+        return self.start_jd + (time.monotonic() - self.started) * self.speed / 86400.0
+
+    def set(self, t):
+        self.start_jd, self.started = _tt_jd(t), time.monotonic()
+
+    def advance(self, seconds):
+        self.start_jd += seconds / 86400.0
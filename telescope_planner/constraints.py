@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Moonlight constraints over the session visibility matrix.
+
+The Moon altitude and illuminated fraction are computed once for the whole
+time grid (one skyfield call for the Moon and one for the Sun), and the
+angular separation from the Moon to every object at every time step comes
+from the alt/az already in the visibility matrix, with the spherical law of
+cosines, so the whole selection is handled with a few array operations.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from telescope_planner.visibility import ROWS_PER_BLOCK
+
+# Angular distance from the Moon (in degrees) at which the penalty of a full
+# Moon drops to half, and the penalty above which even a bright deep space
+# object is considered washed out:
+MOON_HALO_DEGREES = 30.0
+MAX_MOON_PENALTY = 0.5
+
+# Fainter objects stand less moonlight, down to MIN_MOON_TOLERANCE times
+# the maximum penalty. Objects are judged by their surface brightness
+# (mag/arcsec², a full Moon sky is about 18) or by their magnitude, between
+# these bright and faint limits, whichever makes them brighter (e.g. M31,
+# with a faint mean surface brightness, but a bright core). Objects with
+# neither one are mostly small and faint, and taken as such:
+MIN_MOON_TOLERANCE = 0.1
+BRIGHT_SURFACE = 20.0
+FAINT_SURFACE = 24.0
+BRIGHT_MAGNITUDE = 6.0
+FAINT_MAGNITUDE = 12.0
+
+
+def moon_separation_degrees(alt, az, moon_alt, moon_az):
+    """ Angular separation (degrees) between positions (objects × times) and
+    the Moon (one position per time step), all given as alt/az in degrees.
+    """
+    alt, az = np.radians(alt), np.radians(az)
+    moon_alt, moon_az = np.radians(moon_alt), np.radians(moon_az)
+    cos_sep = np.sin(alt) * np.sin(moon_alt) + np.cos(alt) * np.cos(moon_alt) * np.cos(az - moon_az)
+    return np.degrees(np.arccos(np.clip(cos_sep, -1.0, 1.0)))
+
+
+def moonlight_penalty(separation, moon_alt, illumination, halo_degrees=MOON_HALO_DEGREES):
+    """ Sky brightening by the Moon, from 0 (no Moon) to 1 (full Moon right
+    next to the target): the illuminated fraction, scaled by how high the
+    Moon is, and by a Lorentzian falloff with the angular separation.
+    """
+    moon_height = np.clip(np.sin(np.radians(moon_alt)), 0.0, 1.0) ** 0.5
+    falloff = 1.0 / (1.0 + (separation / halo_degrees) ** 2)
+    return illumination * moon_height * falloff
+
+
+def moon_tolerance(catalog, rows, max_penalty=MAX_MOON_PENALTY):
+    """ Highest moonlight penalty each of the given catalog rows stands:
+    max_penalty for bright objects, down to MIN_MOON_TOLERANCE × max_penalty
+    for faint ones."""
+    surface = catalog.surface_brightness[rows].astype(float)
+    magnitude = np.where(np.isnan(catalog.vmag[rows]), catalog.bmag[rows], catalog.vmag[rows])
+    faintness = np.fmin((surface - BRIGHT_SURFACE) / (FAINT_SURFACE - BRIGHT_SURFACE),
+                        (magnitude - BRIGHT_MAGNITUDE) / (FAINT_MAGNITUDE - BRIGHT_MAGNITUDE))
+    faintness = np.clip(np.nan_to_num(faintness, nan=1.0), 0.0, 1.0)
+    return max_penalty * (1.0 - (1.0 - MIN_MOON_TOLERANCE) * faintness)
+
+
+def moon_track(session, times):
+    """ Moon altitude and azimuth (degrees) and illuminated fraction, as seen
+    from the session location at the given times (a skyfield Time array)."""
+    observer = session.observer_at(times)
+    moon = observer.observe(session.planets['moon']).apparent()
+    sun = observer.observe(session.planets['sun']).apparent()
+    moon_alt, moon_az, _ = moon.altaz('standard')
+
+    # Phase angle (Sun-Moon-observer), from the observer-centered vectors:
+    moon_xyz, sun_xyz = moon.position.au, sun.position.au
+    to_sun, to_observer = sun_xyz - moon_xyz, -moon_xyz
+    cos_phase = (to_sun * to_observer).sum(axis=0) / (np.linalg.norm(to_sun, axis=0) *
+                                                      np.linalg.norm(to_observer, axis=0))
+    return moon_alt.degrees, moon_az.degrees, (1.0 + cos_phase) / 2.0
+
+
+def compute_moon_constraints(session, visibility, min_alt=0.0, max_penalty=MAX_MOON_PENALTY):
+    """ Moon altitude and illuminated fraction for each time step of the
+    visibility matrix, and separation (degrees) and moonlight penalty for
+    each object × time cell (float32, same layout as the matrix).
+
+    Solar System objects get no penalty, as moonlight does not hide them.
+    Returns a SimpleNamespace(moon_alt, moon_az, illumination, separation,
+    penalty, tolerance, allowed), where tolerance is the highest penalty each
+    object stands (see moon_tolerance), and allowed tells which objects have
+    at least one time step above min_alt with a penalty up to it.
+    """
+    moon_alt, moon_az, illumination = moon_track(session, visibility.times)
+
+    separation = np.empty_like(visibility.alt)
+    penalty = np.zeros_like(visibility.alt)
+    n_planets = len(session.solar_system)
+    for first in range(0, len(visibility), ROWS_PER_BLOCK):
+        rows = slice(first, first + ROWS_PER_BLOCK)
+        separation[rows] = moon_separation_degrees(visibility.alt[rows], visibility.az[rows], moon_alt, moon_az)
+        penalty[rows] = moonlight_penalty(separation[rows], moon_alt, illumination)
+    penalty[:n_planets] = 0.0
+
+    tolerance = np.full(len(visibility), max_penalty)
+    rows = np.array([obj.catalog_index for obj in session.deepspace_selection], dtype=int)
+    tolerance[n_planets:] = moon_tolerance(session.catalog, rows, max_penalty)
+
+    allowed = ((visibility.alt >= min_alt) & (penalty <= tolerance[:, np.newaxis])).any(axis=1)
+    return SimpleNamespace(moon_alt=moon_alt, moon_az=moon_az, illumination=illumination,
+                           separation=separation, penalty=penalty, tolerance=tolerance, allowed=allowed)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Process-wide, thread-safe cache for the skyfield loaders, timescales and
+ephemeris kernels, so that each kernel is opened and parsed only once per
+process, no matter how many sessions are created.
+
+The SPK kernels are memory-mapped by jplephem when opened, so all the
+sessions share the same pages of the file.
+
+ObserverCache, on the other hand, is owned by each session: it keeps the
+observer state for the instants the session has already used.
+"""
+import threading
+
+import numpy as np
+
+from skyfield.api import Loader
+
+from telescope_planner.settings import DATA_FOLDER, EPHEMERIS_FILE
+
+# Instants (or time arrays) kept by each ObserverCache:
+OBSERVER_CACHE_SIZE = 16
+
+_lock = threading.RLock()
+_loaders = {}
+_timescales = {}
+_kernels = {}
+
+
+def get_loader(folder=DATA_FOLDER):
+    with _lock:
+        if folder not in _loaders:
+            _loaders[folder] = Loader(folder)
+        return _loaders[folder]
+
+
+def get_timescale(folder=DATA_FOLDER):
+    with _lock:
+        if folder not in _timescales:
+            _timescales[folder] = get_loader(folder).timescale()
+        return _timescales[folder]
+
+
+def get_ephemeris(filename=EPHEMERIS_FILE, folder=DATA_FOLDER):
+    with _lock:
+        key = (folder, filename)
+        if key not in _kernels:
+            _kernels[key] = get_loader(folder)(filename)
+        return _kernels[key]
+
+
+class ObserverCache:
+    """ Wraps an observer vector (e.g. earth + Topos) so that at(t) computes
+    the observer state only once per instant, or array of instants.
+
+    The Barycentric position returned by at() keeps the Time it was first
+    computed for, with its precession-nutation matrix and sidereal time,
+    which skyfield also computes once per Time object. So everything
+    observed from it, for the same instant, only pays for its own geometry.
+    Other attributes are taken from the wrapped vector.
+    """
+
+    def __init__(self, vector, size=OBSERVER_CACHE_SIZE):
+        self.vector = vector
+        self.size = size
+        self.states = {}
+
+    def __getattr__(self, name):
+        if name == 'vector':
+            raise AttributeError(name)
+        return getattr(self.vector, name)
+
+    def at(self, t):
+        tt = np.asarray(t.tt, dtype=float)
+        key = (tt.shape, tt.tobytes())
+        state = self.states.get(key)
+        if state is None:
+            if len(self.states) >= self.size:
+                del self.states[next(iter(self.states))]
+            state = self.states[key] = self.vector.at(t)
+        return state
+
+    def clear(self):
+        self.states = {}
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Rise, transit and set times for Solar System and deep space objects.
+
+All the Solar System bodies are evaluated on one shared, coarse time grid
+(the observer position is computed only once for the whole grid), then every
+sign change found in the grid is refined with a few vectorized secant
+iterations. Fixed (deep space) objects need no ephemeris at all: their events
+come from the hour angle formula, for the whole selection at once.
+"""
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import numpy as np
+
+from skyfield.api import Topos
+
+from telescope_planner.skymath import local_sidereal_degrees
+
+# Standard refraction at the horizon, in degrees:
+REFRACTION_DEGREES = 34.0 / 60.0
+
+# Geometric altitude of the object center at rise/set, in degrees: standard
+# refraction at the horizon, plus the semi-diameter for the Sun and the Moon
+# (topocentric altitudes are used, so no parallax correction is needed).
+DEFAULT_HORIZON = -REFRACTION_DEGREES
+HORIZONS = {'sun': -0.8333, 'moon': -0.8333}
+
+SIDEREAL_DEGREES_PER_DAY = 360.98564736629
+
+COARSE_STEP_MINUTES = 30
+REFINE_ITERATIONS = 3
+
+RISE, SET, TRANSIT = 1, 2, 3
+
+# Sun altitude (in degrees) at the start and end of each kind of night:
+TWILIGHTS = {'sunset': -0.8333, 'civil': -6.0, 'nautical': -12.0, 'astronomical': -18.0}
+
+# The Sun altitude changes slowly enough for a coarser grid:
+SUN_STEP_MINUTES = 60
+
+# Dark windows are cached for locations rounded to this step (in degrees;
+# 0.01° moves sunset by a few seconds at most):
+LOCATION_QUANTUM_DEGREES = 0.01
+
+# Nights searched for the next dusk or dawn, before giving up (polar day/night):
+MAX_SEARCH_NIGHTS = 366
+
+# Dark windows (one per location, twilight and night) kept in the process,
+# least recently used first out:
+DARK_WINDOW_CACHE_SIZE = 4096
+
+_dark_windows = OrderedDict()
+_dark_windows_lock = threading.Lock()
+
+
+def time_grid(ts, start, end, step_minutes=COARSE_STEP_MINUTES):
+    """A Time array from start to end (both included), with about the given step."""
+    steps = max(int(np.ceil((end.tt - start.tt) * 24 * 60 / step_minutes)), 1)
+    return ts.tt_jd(np.linspace(start.tt, end.tt, steps + 1))
+
+
+def _wrap_degrees(angle):
+    return (angle + 180.0) % 360.0 - 180.0
+
+
+def _altitude_and_hour_angle(observer, body, t, longitude):
+    apparent = observer.observe(body).apparent()
+    alt, _, _ = apparent.altaz()
+    ra, _, _ = apparent.radec(epoch='date')
+    return alt.degrees, _wrap_degrees(local_sidereal_degrees(t, longitude) - ra._degrees)
+
+
+def refine_roots(f, lo, hi, f_lo, f_hi, iterations=REFINE_ITERATIONS):
+    """ Vectorized secant iterations over many brackets at once.
+
+    f takes an array of Julian dates and returns an array of function values.
+    Each [lo, hi] bracket must contain a sign change, and be small enough for
+    the function to be smooth inside it (as with the coarse time grid).
+    """
+    t0, t1, f0, f1 = lo, hi, f_lo, f_hi
+    for _ in range(iterations):
+        converged = (t1 == t0) | (f1 == f0) | (f1 == 0)
+        slope = np.where(converged, 1.0, f1 - f0) / np.where(converged, 1.0, t1 - t0)
+        t_next = np.clip(t1 - f1 / slope, lo, hi)
+        t0, f0 = t1, f1
+        t1 = np.where(converged, t1, t_next)
+        f1 = f(t1)
+    return t1
+
+
+def find_solar_system_events(ts, here, ephemeris, names, start, end, longitude,
+                             step_minutes=COARSE_STEP_MINUTES):
+    """ Rise, transit and set times for the named bodies, between start and
+    end, as seen from here.
+
+    Returns a dict of SimpleNamespace(rises, sets, transits, up_at_start),
+    keyed by body name, where the times are lists of skyfield Time objects
+    (a multi-night session can have several events of each kind).
+    """
+    grid = time_grid(ts, start, end, step_minutes)
+    observer = here.at(grid)
+    bodies = [ephemeris[name] for name in names]
+    horizons = np.array([HORIZONS.get(name, DEFAULT_HORIZON) for name in names])
+
+    # Bodies × times arrays, sharing the same observer positions:
+    alt, ha = np.array([_altitude_and_hour_angle(observer, body, grid, longitude) for body in bodies]).swapaxes(0, 1)
+    above = alt - horizons[:, np.newaxis]
+
+    # Brackets: rises and sets from the altitude sign changes, transits where
+    # the hour angle goes from negative to positive (and not across ±180°).
+    kinds = np.zeros(above[:, :-1].shape, dtype=int)
+    kinds[(above[:, :-1] < 0) & (above[:, 1:] >= 0)] = RISE
+    kinds[(above[:, :-1] >= 0) & (above[:, 1:] < 0)] = SET
+    is_transit = (ha[:, :-1] < 0) & (ha[:, 1:] >= 0) & (ha[:, 1:] - ha[:, :-1] < 180.0)
+    body_rows, steps = np.nonzero(kinds)
+    transit_rows, transit_steps = np.nonzero(is_transit)
+    body_rows = np.concatenate([body_rows, transit_rows])
+    steps = np.concatenate([steps, transit_steps])
+    event_kinds = np.concatenate([kinds[kinds != 0], np.full(len(transit_rows), TRANSIT)])
+    transits = event_kinds == TRANSIT
+
+    def f(jd):
+        """Event functions for all the brackets at once, one observer call per iteration."""
+        t = ts.tt_jd(jd)
+        observer_t = here.at(t)
+        values = np.empty(len(jd))
+        for row in np.unique(body_rows):
+            alt_t, ha_t = _altitude_and_hour_angle(observer_t, bodies[row], t, longitude)
+            mine = body_rows == row
+            values[mine] = np.where(transits, ha_t, alt_t - horizons[row])[mine]
+        return values
+
+    if len(steps):
+        values = np.where(transits, ha[body_rows, steps], above[body_rows, steps])
+        next_values = np.where(transits, ha[body_rows, steps + 1], above[body_rows, steps + 1])
+        roots = ts.tt_jd(refine_roots(f, grid.tt[steps], grid.tt[steps + 1], values, next_values))
+
+    results = {}
+    for row, name in enumerate(names):
+        events = {RISE: [], SET: [], TRANSIT: []}
+        for i in np.flatnonzero(body_rows == row):
+            events[event_kinds[i]].append(roots[i])
+        results[name] = SimpleNamespace(rises=events[RISE], sets=events[SET], transits=events[TRANSIT],
+                                        up_at_start=bool(above[row, 0] >= 0))
+    return results
+
+
+def fixed_object_events(ra_hours, dec_degrees, latitude, longitude, start, end, horizon=0.0, refraction=True):
+    """ Closed-form rise, transit and set times for objects with fixed RA/Dec
+    (preferably apparent coordinates of date), between start and end.
+
+    The rising hour angle comes from cos(H0) = (sin(h0) - sin(lat).sin(dec)) /
+    (cos(lat).cos(dec)), where h0 is the horizon altitude in degrees, lowered
+    by the standard refraction unless refraction is False. Events repeat every
+    sidereal day, so all the objects and nights are solved with a few array
+    operations.
+
+    Returns a SimpleNamespace with rises, sets and transits as (objects ×
+    events) arrays of TT Julian dates, padded with NaN, and the up_at_start,
+    up_during_session, always_up and never_up boolean arrays.
+    """
+    ra = np.asarray(ra_hours, dtype=float)[:, np.newaxis] * 15.0
+    dec = np.radians(np.asarray(dec_degrees, dtype=float))[:, np.newaxis]
+    lat = np.radians(latitude)
+    h0 = np.radians(horizon - (REFRACTION_DEGREES if refraction else 0.0))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_h0 = (np.sin(h0) - np.sin(lat) * np.sin(dec)) / (np.cos(lat) * np.cos(dec))
+    always_up, never_up = cos_h0 < -1.0, cos_h0 > 1.0
+    semi_arc = np.degrees(np.arccos(np.clip(cos_h0, -1.0, 1.0)))
+
+    span = end.tt - start.tt
+    lst_start = local_sidereal_degrees(start, longitude)
+    sidereal_day = 360.0 / SIDEREAL_DEGREES_PER_DAY
+    repeats = np.arange(int(np.ceil(span / sidereal_day)) + 1)
+
+    def crossings(target_lst, valid):
+        """Times when the local sidereal time reaches target_lst (degrees)."""
+        first = ((target_lst - lst_start) % 360.0) / SIDEREAL_DEGREES_PER_DAY
+        offsets = first + repeats * sidereal_day
+        return np.where(valid & (offsets <= span), start.tt + offsets, np.nan)
+
+    rises = crossings(ra - semi_arc, ~(always_up | never_up))
+    sets = crossings(ra + semi_arc, ~(always_up | never_up))
+    transits = crossings(ra, ~never_up)
+
+    hour_angle = np.abs((lst_start - ra + 180.0) % 360.0 - 180.0)
+    up_at_start = always_up | (~never_up & (hour_angle <= semi_arc))
+    up_at_start = up_at_start[:, 0]
+    return SimpleNamespace(rises=rises, sets=sets, transits=transits, up_at_start=up_at_start,
+                           up_during_session=up_at_start | ~np.isnan(rises).all(axis=1),
+                           always_up=always_up[:, 0], never_up=never_up[:, 0])
+
+
+def night_numbers(jd, longitude):
+    """ Number of the (local noon to noon) night for TT Julian dates: night n
+    starts at jd = n - longitude / 360, close to local noon."""
+    return np.floor(np.asarray(jd) + longitude / 360.0).astype(int)
+
+
+def _quantize(value):
+    return round(round(value / LOCATION_QUANTUM_DEGREES) * LOCATION_QUANTUM_DEGREES, 6)
+
+
+def _compute_dark_windows(ts, ephemeris, latitude, longitude, nights, sun_altitude):
+    """ Dusk and dawn (TT Julian dates, NaN when there is none) for a range of
+    consecutive nights, from one sun altitude evaluation on a coarse grid
+    covering all of them, plus a few vectorized refinement steps."""
+    here = ephemeris['earth'] + Topos(latitude_degrees=latitude, longitude_degrees=longitude)
+    sun = ephemeris['sun']
+    first = nights[0] - longitude / 360.0
+    grid = time_grid(ts, ts.tt_jd(first), ts.tt_jd(first + len(nights)), SUN_STEP_MINUTES)
+
+    def f(jd):
+        alt, _, _ = here.at(ts.tt_jd(jd)).observe(sun).apparent().altaz()
+        return alt.degrees - sun_altitude
+
+    above = f(grid.tt)
+    steps = np.flatnonzero(np.sign(above[:-1]) != np.sign(above[1:]))
+    roots = refine_roots(f, grid.tt[steps], grid.tt[steps + 1], above[steps], above[steps + 1]) if len(steps) else steps
+    is_dusk = above[steps] > 0
+    owner = night_numbers(roots, longitude) - nights[0]
+
+    dusk, dawn = np.full(len(nights), np.nan), np.full(len(nights), np.nan)
+    for night in range(len(nights)):
+        mine = owner == night
+        dusks = roots[mine & is_dusk]
+        if len(dusks):
+            dusk[night] = dusks[0]
+            dawns = roots[mine & ~is_dusk & (roots > dusks[0])]
+            # The night ends at the first dawn, which may be after next noon:
+            later = roots[~is_dusk & (roots > dusks[0])]
+            dawn[night] = dawns[0] if len(dawns) else (later[0] if len(later) else np.nan)
+    return dusk, dawn
+
+
+def dark_windows(ts, ephemeris, latitude, longitude, start, nights=1, twilight='sunset'):
+    """ Dark windows (Sun below the twilight altitude) for consecutive nights,
+    the first one being the night that contains start (a skyfield Time).
+
+    twilight is one of the TWILIGHTS names, or a Sun altitude in degrees.
+    Results are cached per night and quantized location (up to
+    DARK_WINDOW_CACHE_SIZE of them), and all the missing nights of a call are
+    computed at once. Returns a SimpleNamespace with the
+    night numbers and the dusk and dawn arrays (TT Julian dates, NaN for
+    nights with no dusk, as in polar summer).
+    """
+    sun_altitude = TWILIGHTS.get(twilight, twilight)
+    latitude, longitude = _quantize(latitude), _quantize(longitude)
+    numbers = night_numbers(start.tt, longitude) + np.arange(nights)
+    keys = [(latitude, longitude, sun_altitude, int(n)) for n in numbers]
+    with _dark_windows_lock:
+        windows = {key: _dark_windows[key] for key in keys if key in _dark_windows}
+        for key in windows:
+            _dark_windows.move_to_end(key)
+    missing = [key[3] for key in keys if key not in windows]
+    if missing:
+        # One extra night, so that a dawn after next noon is still found:
+        computed = np.arange(min(missing), max(missing) + 2)
+        dusk, dawn = _compute_dark_windows(ts, ephemeris, latitude, longitude, computed, sun_altitude)
+        with _dark_windows_lock:
+            for n, night_dusk, night_dawn in zip(computed[:-1], dusk, dawn):
+                key = (latitude, longitude, sun_altitude, int(n))
+                windows[key] = _dark_windows[key] = (night_dusk, night_dawn)
+                _dark_windows.move_to_end(key)
+            while len(_dark_windows) > DARK_WINDOW_CACHE_SIZE:
+                _dark_windows.popitem(last=False)
+    dusk, dawn = np.array([windows[key] for key in keys]).reshape(-1, 2).T
+    return SimpleNamespace(nights=numbers, dusk=dusk, dawn=dawn)
+
+
+def next_dark_window(ts, ephemeris, latitude, longitude, after, twilight='sunset'):
+    """ The next dark window that has not ended yet at after (a skyfield
+    Time), as TT Julian dates (dusk, dawn). If the window has already
+    started, dusk is before after. Returns (None, None) if there is no dark
+    window within MAX_SEARCH_NIGHTS.
+    """
+    for nights in (2, MAX_SEARCH_NIGHTS):
+        windows = dark_windows(ts, ephemeris, latitude, longitude, ts.tt_jd(after.tt - 1.0), nights + 1, twilight)
+        for dusk, dawn in zip(windows.dusk, windows.dawn):
+            if not np.isnan(dusk) and (dawn > after.tt or np.isnan(dawn)):
+                return dusk, dawn
+    return None, None
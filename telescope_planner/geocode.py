@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-import geocoder
 import math
 
 from telescope_planner.constants import DEFAULT_LOCATION
@@ -85,6 +84,8 @@ def get_location_ios():
 
 
 def get_location_current_ip():
+    import geocoder  # imported here, as it takes a while to load (requests, etc.)
+
     g = geocoder.ip('me')
     dms_lat, dms_lng = dd2dms(g.latlng[0], g.latlng[1])
 
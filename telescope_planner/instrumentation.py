@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Per-phase timing instrumentation.
+
+Code paths are wrapped in named phases:
+
+    with timer.phase('catalog_query') as phase:
+        rows = ...
+        phase.objects = len(rows)
+
+Each phase accumulates its wall time, number of calls and number of objects
+processed. When the timer is disabled, phase() returns a shared do-nothing
+context manager, so the instrumented code runs at (almost) full speed.
+"""
+import json
+import time
+
+
+class _NullPhase:
+    objects = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ('timer', 'name', 'objects', 'started')
+
+    def __init__(self, timer, name, objects):
+        self.timer = timer
+        self.name = name
+        self.objects = objects
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, time.perf_counter() - self.started, self.objects)
+        return False
+
+
+class PhaseTimer:
+    """ Wall time (seconds), calls and objects, accumulated per phase name,
+    in the order the phases first ran."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.phases = {}
+
+    def phase(self, name, objects=None):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name, objects)
+
+    def add(self, name, seconds, objects=None):
+        phase = self.phases.setdefault(name, {'seconds': 0.0, 'calls': 0, 'objects': 0})
+        phase['seconds'] += seconds
+        phase['calls'] += 1
+        phase['objects'] += objects or 0
+
+    def reset(self):
+        self.phases = {}
+
+    def report(self):
+        """A JSON-ready dict: enabled flag, total seconds and the phases."""
+        return {'enabled': self.enabled,
+                'total_seconds': sum(phase['seconds'] for phase in self.phases.values()),
+                'phases': {name: dict(phase) for name, phase in self.phases.items()},
+                }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
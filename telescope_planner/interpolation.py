@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Chebyshev interpolation tables for Solar System bodies.
+
+Over a session window, each body's topocentric apparent RA/Dec (of date) and
+distance are fitted, per segment of a few hours, with low-order Chebyshev
+polynomials. A position query then costs a polynomial evaluation plus the
+hour angle rotation to alt/az, instead of the full skyfield pipeline (with
+its light-time iteration). Alt/az are not fitted directly, as azimuth is not
+smooth near the zenith.
+
+The fit is checked against skyfield at points halfway between the fitting
+nodes, and the worst angular error found is kept in each table (as
+max_error_arcsec). With the defaults below it stays under a milliarcsecond
+for every body, including the Moon. The alt/az derived from the tables,
+refracted for the site elevation like skyfield's altaz('standard'), agree
+with skyfield's own to about 0.01 arcsecond above 1° of altitude, and to
+about 0.5 arcsecond closer to the horizon, where refraction changes fastest
+(see tests/test_interpolation.py).
+"""
+import numpy as np
+from numpy.polynomial import chebyshev
+
+from telescope_planner.skymath import local_sidereal_degrees, radec_to_altaz, refract
+from telescope_planner.skymath import standard_pressure
+
+CHEBYSHEV_DEGREE = 8
+SEGMENT_HOURS = 2.0
+
+
+class ChebyshevTable:
+    """ Piecewise Chebyshev fit of one body's apparent RA (hours), Dec
+    (degrees) and distance (au) over consecutive time segments.
+    """
+
+    def __init__(self, name, edges, ra_coefs, dec_coefs, distance_coefs, max_error_arcsec):
+        self.name = name
+        self.edges = edges  # TT Julian dates, n_segments + 1
+        self.ra_coefs = ra_coefs  # (degree + 1) × n_segments
+        self.dec_coefs = dec_coefs
+        self.distance_coefs = distance_coefs
+        self.max_error_arcsec = max_error_arcsec
+
+    @property
+    def start(self):
+        return self.edges[0]
+
+    @property
+    def end(self):
+        return self.edges[-1]
+
+    def covers(self, jd):
+        jd = np.asarray(jd)
+        return bool(np.all((jd >= self.start) & (jd <= self.end)))
+
+    def _evaluate(self, coefs, segment, x):
+        return chebyshev.chebval(x, coefs[:, segment], tensor=False)
+
+    def radec(self, jd):
+        """Apparent RA (hours), Dec (degrees) and distance (au) for TT Julian dates."""
+        jd = np.asarray(jd, dtype=float)
+        segment = np.clip(np.searchsorted(self.edges, jd, side='right') - 1, 0, len(self.edges) - 2)
+        lo, hi = self.edges[segment], self.edges[segment + 1]
+        x = 2.0 * (jd - lo) / (hi - lo) - 1.0
+        ra = self._evaluate(self.ra_coefs, segment, x) % 24.0
+        return ra, self._evaluate(self.dec_coefs, segment, x), self._evaluate(self.distance_coefs, segment, x)
+
+    def altaz(self, t, latitude, longitude, elevation_m=0.0):
+        """ Apparent alt/az (degrees, with standard refraction for the
+        elevation, in meters) and distance (au) for a skyfield Time (scalar
+        or array)."""
+        ra, dec, distance = self.radec(t.tt)
+        alt, az = radec_to_altaz(ra * 15.0, dec, local_sidereal_degrees(t, longitude), latitude)
+        return refract(alt, pressure_mbar=standard_pressure(elevation_m)), az, distance
+
+
+def _chebyshev_nodes(degree):
+    """Fitting nodes in [-1, 1], and the check points halfway between them."""
+    nodes = np.cos(np.pi * (np.arange(degree + 1) + 0.5) / (degree + 1))[::-1]
+    return nodes, (nodes[:-1] + nodes[1:]) / 2
+
+
+def fit_chebyshev_tables(ts, here, ephemeris, names, start, end,
+                         segment_hours=SEGMENT_HOURS, degree=CHEBYSHEV_DEGREE):
+    """ Fit a ChebyshevTable for each named body, from start to end (at
+    least one segment long), as seen from here.
+
+    All the fitting nodes and check points of all the segments go into a
+    single Time array, so that the observer position is computed only once,
+    and each body takes one vectorized skyfield call. Returns a dict of
+    tables, keyed by body name.
+    """
+    span = max(end.tt - start.tt, segment_hours / 24.0)
+    n_segments = int(np.ceil(span * 24.0 / segment_hours))
+    edges = start.tt + np.linspace(0.0, span, n_segments + 1)
+    half_width = (edges[1] - edges[0]) / 2
+
+    nodes, checks = _chebyshev_nodes(degree)
+    x = np.concatenate([nodes, checks])
+    centers = (edges[:-1] + edges[1:]) / 2
+    jd = centers[np.newaxis, :] + half_width * x[:, np.newaxis]  # points × segments
+    t = ts.tt_jd(jd.ravel())
+    observer = here.at(t)
+    n_nodes = len(nodes)
+
+    tables = {}
+    for name in names:
+        ra, dec, distance = observer.observe(ephemeris[name]).apparent().radec(epoch='date')
+        ra_deg = np.unwrap(np.radians(ra._degrees.reshape(jd.shape)), axis=0)
+        values = np.degrees(ra_deg) / 15.0, dec.degrees.reshape(jd.shape), distance.au.reshape(jd.shape)
+        coefs = [chebyshev.chebfit(nodes, value[:n_nodes], degree) for value in values]
+
+        # Angular error at the check points, in arcseconds:
+        fitted = [chebyshev.chebval(checks, c).T for c in coefs[:2]]
+        d_ra = (fitted[0] - values[0][n_nodes:]) * 15.0 * np.cos(np.radians(values[1][n_nodes:]))
+        d_dec = fitted[1] - values[1][n_nodes:]
+        max_error = float(np.hypot(d_ra, d_dec).max() * 3600.0)
+
+        tables[name] = ChebyshevTable(name, edges, *coefs, max_error)
+    return tables
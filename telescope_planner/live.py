@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Live refresh of alt/az positions, for "what's up now" displays.
+
+Over a few minutes, the apparent RA/Dec of date of a deep space object
+barely changes: what moves it across the sky is the Earth rotation. So the
+full astrometric → apparent chain is only run once per drift interval, to
+cache the apparent equatorial unit vector of each object, and every tick in
+between just rotates the cached vectors to the local horizon (one 3×3 matrix
+for the local sidereal time of the tick) and applies the standard refraction
+for the site elevation.
+
+Solar System objects move by themselves (the Moon, about 0.5° per hour,
+plus its changing parallax), so their vectors are also computed at the end of
+the drift interval, and linearly interpolated on each tick.
+"""
+import numpy as np
+
+from skyfield.units import Angle, Distance
+
+from telescope_planner.events import SIDEREAL_DEGREES_PER_DAY
+from telescope_planner.positions import DeepSpacePositions
+from telescope_planner.skymath import is_inside_altaz_window, local_sidereal_degrees, refract, standard_pressure
+from telescope_planner.skymath import unit_vectors
+
+# Time between two full recomputations of the apparent positions:
+LIVE_DRIFT_SECONDS = 300.0
+
+
+def horizon_matrix(lst_degrees, latitude):
+    """ Rotation from equatorial of date to local (north, east, up)
+    coordinates, at the given local sidereal time and latitude."""
+    lst, lat = np.radians(lst_degrees), np.radians(latitude)
+    to_meridian = np.array([[np.cos(lst), np.sin(lst), 0.0],
+                            [-np.sin(lst), np.cos(lst), 0.0],
+                            [0.0, 0.0, 1.0]])
+    to_horizon = np.array([[-np.sin(lat), 0.0, np.cos(lat)],
+                           [0.0, 1.0, 0.0],
+                           [np.cos(lat), 0.0, np.sin(lat)]])
+    return to_horizon @ to_meridian
+
+
+class LiveSky:
+    """ Alt/az of a fixed list of session objects (by default, the Solar
+    System objects and the deep space selection), refreshed with tick().
+
+    After each tick, alt and az (degrees, refracted) hold one value per
+    object, in the same order as objects. Call apply() to copy them to the
+    observer objects themselves, when they are needed there.
+    """
+
+    def __init__(self, session, objects=None, drift_seconds=LIVE_DRIFT_SECONDS):
+        self.session = session
+        self.objects = list(objects) if objects is not None else session.solar_system + session.deepspace_selection
+        self.drift = drift_seconds / 86400.0
+        self.vectors = np.empty((len(self.objects), 3))
+        self.velocities = np.zeros((len(self.objects), 3))  # per day
+        self.distances = [None] * len(self.objects)
+        self.reference_jd = None
+        self.reference_lst = None
+        self.alt = np.full(len(self.objects), np.nan)
+        self.az = np.full(len(self.objects), np.nan)
+        self.refreshes = 0
+
+    def refresh(self, t):
+        """ Recompute the apparent equatorial vectors of date at time t: one
+        batched call for the deep space objects, and one per Solar System
+        object (at t and at the end of the drift interval, for its motion)."""
+        session = self.session
+        fixed = [i for i, obj in enumerate(self.objects) if hasattr(obj, 'ra_hours')]
+        if fixed:
+            positions = DeepSpacePositions([self.objects[i].ra_hours for i in fixed],
+                                           [self.objects[i].dec_degrees for i in fixed])
+            ra, dec = positions.radec_of_date(session.here, t)
+            self.vectors[fixed] = unit_vectors(ra * 15.0, dec)
+
+        observer, span = None, max(self.drift, 1e-3)
+        for i, obj in enumerate(self.objects):
+            if hasattr(obj, 'ra_hours'):
+                continue
+            if observer is None:
+                times = session.ts.tt_jd(np.array([t.tt, t.tt + span]))
+                observer = session.here.at(times)
+            apparent = observer.observe(obj.p).apparent()
+            xyz = np.einsum('ijk,jk->ik', times.M, apparent.position.au)
+            xyz = xyz / np.sqrt((xyz * xyz).sum(axis=0))
+            self.distances[i] = Distance(au=apparent.distance().au[0])
+            self.vectors[i] = xyz[:, 0]
+            self.velocities[i] = (xyz[:, 1] - xyz[:, 0]) / span
+
+        self.reference_jd = t.tt
+        self.reference_lst = local_sidereal_degrees(t, session.longitude)
+        self.refreshes += 1
+
+    def tick(self, t=None):
+        """ Update alt/az for time t (by default, now), refreshing the cached
+        vectors first if they are older than the drift interval. Returns the
+        (alt, az) arrays."""
+        t = t if t is not None else self.session.now()
+        if self.reference_jd is None or abs(t.tt - self.reference_jd) > self.drift:
+            self.refresh(t)
+        if not len(self.objects):
+            return self.alt, self.az
+
+        elapsed = t.tt - self.reference_jd
+        vectors = self.vectors + self.velocities * elapsed
+        lst = self.reference_lst + elapsed * SIDEREAL_DEGREES_PER_DAY
+        north, east, up = horizon_matrix(lst, self.session.latitude).dot(vectors.T)
+        up = up / np.sqrt(north ** 2 + east ** 2 + up ** 2)
+        self.alt = refract(np.degrees(np.arcsin(np.clip(up, -1.0, 1.0))),
+                           pressure_mbar=standard_pressure(self.session.altitude))
+        self.az = np.degrees(np.arctan2(east, north)) % 360.0
+        return self.alt, self.az
+
+    def apply(self):
+        """Set the alt/az (and, for Solar System objects, distance) of the last tick on the observers."""
+        for obj, alt, az, distance in zip(self.objects, self.alt, self.az, self.distances):
+            if distance is None:
+                obj.set_coords(alt, az)
+            else:
+                obj.alt, obj.az, obj.distance = Angle(degrees=alt), Angle(degrees=az), distance
+
+    def visible(self):
+        """The objects inside the session alt/az window at the last tick."""
+        session = self.session
+        inside = is_inside_altaz_window(self.alt, self.az, session.min_alt, session.max_alt,
+                                        session.min_az, session.max_az)
+        return [obj for obj, is_inside in zip(self.objects, inside) if is_inside]
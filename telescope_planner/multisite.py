@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Plan the same time window for several observing sites at once.
+
+Each site is planned in a worker process. Every worker opens the catalog
+snapshot and the ephemeris kernel once, in its initializer: both are
+memory-mapped read-only files, so all the workers share the same pages and
+nothing large is pickled between processes. Only the small per-site reports
+(plain dicts) come back to the parent, where they are consolidated.
+"""
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+from telescope_planner.constants import DEFAULT_LOCATION, SOLAR_SYSTEM
+from telescope_planner.constants import ALTERNATIVE_LOCATION1, ALTERNATIVE_LOCATION2, ALTERNATIVE_LOCATION3
+from telescope_planner.settings import CATALOG_FOLDER, EPHEMERIS_FILE
+
+SITES = [DEFAULT_LOCATION, ALTERNATIVE_LOCATION1, ALTERNATIVE_LOCATION2, ALTERNATIVE_LOCATION3]
+
+TOP_OBJECTS = 20
+
+
+def _init_worker(catalog_folder, ephemeris_file):
+    from telescope_planner.catalog import get_catalog
+    from telescope_planner.ephemeris import get_ephemeris, get_timescale
+
+    get_catalog(catalog_folder)
+    get_ephemeris(ephemeris_file)
+    get_timescale()
+
+
+def _site_fields(site):
+    return {'city': site.city, 'country': site.country, 'latitude': site.latitude,
+            'longitude': site.longitude, 'altitude': site.altitude}
+
+
+def plan_site(site, start_jd, end_jd, top=TOP_OBJECTS, session_params=None):
+    """ Visibility report for one site (a dict with the DEFAULT_LOCATION
+    fields) over a time window given as TT Julian dates (None for the session
+    defaults, i.e. the current or next night). Returns a dict with
+    the site, the dark window, the Solar System objects up during the window
+    and the best deep space objects (see Session.best)."""
+    from telescope_planner.ephemeris import get_timescale
+    from telescope_planner.session import Session
+
+    ts = get_timescale()
+    start = ts.tt_jd(start_jd) if start_jd is not None else None
+    end = ts.tt_jd(end_jd) if end_jd is not None else None
+    session = Session(timescale=ts, start=start, end=end, latitude=site['latitude'], longitude=site['longitude'],
+                      altitude=site['altitude'] or 0.0, stream=True, **(session_params or {}))
+    start, end = session.start, session.end
+
+    dark = session.get_dark_windows(1, twilight='astronomical')
+    planets = []
+    for name in SOLAR_SYSTEM:
+        events = session.get_solar_system_events(name)
+        planets.append({'name': name.split()[0].upper(),
+                        'up_during_session': bool(events.rises or events.sets or events.up_at_start),
+                        'rises': [t.utc_iso() for t in events.rises],
+                        'sets': [t.utc_iso() for t in events.sets],
+                        })
+    best = [{'name': obj.name, 'messier': obj.messier, 'kind': obj.kind, 'constellation': obj.constellation,
+             'vmag': obj.magnitudes['V'], 'score': obj.score}
+            for obj in session.best(top)]
+
+    return {'site': site,
+            'start': start.utc_iso(),
+            'end': end.utc_iso(),
+            'astronomical_dusk': None if math.isnan(dark.dusk[0]) else ts.tt_jd(dark.dusk[0]).utc_iso(),
+            'astronomical_dawn': None if math.isnan(dark.dawn[0]) else ts.tt_jd(dark.dawn[0]).utc_iso(),
+            'planets': planets,
+            'best': best,
+            }
+
+
+def _plan_site_job(job):
+    return plan_site(*job)
+
+
+def plan_sites(start, end, sites=None, workers=None, top=TOP_OBJECTS, **session_params):
+    """ Plan the window from start to end (skyfield Time objects) for each of
+    the sites (by default, SITES), over a pool of worker processes (by
+    default, one per CPU, up to the number of sites; with workers=1, all the
+    work is done in this process).
+
+    Returns a consolidated report: a SimpleNamespace with the window, the
+    per-site reports (in the same order as the sites) and the deep space
+    objects that are among the best ones at every site.
+    """
+    from telescope_planner.catalog import get_catalog
+    from telescope_planner.ephemeris import get_ephemeris
+
+    sites = sites if sites is not None else SITES
+    workers = workers if workers is not None else min(len(sites), os.cpu_count() or 1)
+    jobs = [(_site_fields(site), start.tt, end.tt, top, session_params) for site in sites]
+
+    # Make sure the snapshot and the kernel exist before the workers open them:
+    get_catalog(CATALOG_FOLDER)
+    get_ephemeris(EPHEMERIS_FILE)
+
+    if workers <= 1:
+        reports = [_plan_site_job(job) for job in jobs]
+    else:
+        logging.debug(f"Planning {len(jobs)} sites over {workers} processes")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(CATALOG_FOLDER, EPHEMERIS_FILE)) as pool:
+            reports = list(pool.map(_plan_site_job, jobs))
+
+    best_sets = [{obj['name'] for obj in report['best']} for report in reports]
+    shared = set.intersection(*best_sets) if best_sets else set()
+    shared = [obj['name'] for obj in reports[0]['best'] if obj['name'] in shared] if reports else []
+    return SimpleNamespace(start=start.utc_iso(), end=end.utc_iso(), sites=reports, shared_best=shared)
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 
-import logging
-
 from abc import ABC, abstractmethod
-from pyongc import ongc
-from skyfield.api import Star
+
+import numpy as np
+from skyfield.units import Angle, Distance
+
+from telescope_planner.positions import DeepSpacePositions
 
 
 class SpaceObserver(ABC):
@@ -33,6 +34,8 @@ class SpaceObserver(ABC):
         self.time = session.start
         self.session_rises = None
         self.session_sets = None
+        self.session_transits = None
+        self.up_at_session_start = None
 
     @abstractmethod
     def name(self):
@@ -52,11 +55,19 @@ class SpaceObserver(ABC):
 
     def will_be_up_during_session(self):
         """Will this object be above the horizon between start and end times?"""
-        if self.session_rises or self.session_sets:
+        if self.session_rises or self.session_sets or self.up_at_session_start:
             return True
         else:
             return False
 
+    def passes_moon_constraints(self):
+        """ Is there a time step with this object up and little enough
+        moonlight? Always True until the session Moon constraints are computed
+        (see Session.compute_moon_constraints)."""
+        moon = self.session.moon_constraints
+        row = self.session.visibility.row(self) if moon is not None else None
+        return True if row is None else bool(moon.allowed[row])
+
     def __str__(self):
         cls_name = self.__class__.__name__
         return f'<{cls_name}: {self.name}, {self.kind} observed from {self.session.latitude} {self.session.longitude}>'
@@ -76,7 +87,7 @@ class PlanetObserver(SpaceObserver):
         self.kind = 'Solar System object'  # TODO: distinguish between regular planets, dwarf, moons...
 
         self.p = session.planets[object_name]
-        self.planet_astro_session = self.session.here.at(self.session.start).observe(self.p)
+        self.planet_astro_session = self.session.observer_at(self.session.start).observe(self.p)
         self.planet_app_session = self.planet_astro_session.apparent()
         self.planet_astro_now = None
         self.planet_app_now = None
@@ -94,17 +105,31 @@ class PlanetObserver(SpaceObserver):
         The generated values are made available as lists of dates, as the user
         may eventually try to plan a mega-session spanning more than one night/day.
         """
-        # TODO
-        self.session_rises = []
-        self.session_sets = []
+        events = self.session.get_solar_system_events(self.object_name)
+        self.session_rises = events.rises
+        self.session_sets = events.sets
+        self.session_transits = events.transits
+        self.up_at_session_start = events.up_at_start
 
     def will_be_visible_during_session(self):
         """Will this object be above the horizon between start and end times?"""
-        # TODO: add other criteria (sun, moon, weather?…)
-        return self.will_be_up_during_session()
+        # TODO: add other criteria (sun, weather?…)
+        return self.will_be_up_during_session() and self.passes_moon_constraints()
 
-    def update_coords(self):
-        self.planet_astro_now = self.session.here.at(self.session.ts.now()).observe(self.p)
+    def update_coords(self, t=None):
+        """ Update alt/az and distance for the given time (by default, now).
+        Inside the session window, these come from the session interpolation
+        table for this object, otherwise from the full skyfield computation.
+        """
+        t = t if t is not None else self.session.now()
+        table = self.session.get_solar_system_table(self.object_name)
+        if table.covers(t.tt):
+            alt, az, distance = table.altaz(t, self.session.latitude, self.session.longitude,
+                                              self.session.altitude)
+            self.alt, self.az = Angle(degrees=alt), Angle(degrees=az)
+            self.distance = Distance(au=distance)
+            return
+        self.planet_astro_now = self.session.observer_at(t).observe(self.p)
         self.planet_app_now = self.planet_astro_now.apparent()
         self.alt, self.az, self.distance = self.planet_app_now.altaz('standard')
 
@@ -129,46 +154,56 @@ class DeepSpaceObserver(SpaceObserver):
     """
 
     def __init__(self, object_name, session):
-        super().__init__(object_name, session)
-        if type(object_name) == ongc.Dso:
-            self.dso = object_name  # If class initialized directly with a Dso, use it, else create a new one.
+        # The object can be given as a row index in the session catalog
+        # snapshot, as a name (NGC, IC or Messier) or as a pyongc Dso.
+        catalog = session.catalog
+        if hasattr(object_name, 'getName'):
+            object_name = object_name.getName()
+        if isinstance(object_name, str):
+            self.catalog_index = catalog.index_of(object_name)
         else:
-            try:
-                self.dso = ongc.Dso(object_name)
-            except Exception as e:
-                logging.warning(e)
-        #print("DSO:", self.dso, type(self.dso))
+            self.catalog_index = int(object_name)
+        super().__init__(catalog.name(self.catalog_index), session)
+        self._dso = None
+        self._alt_ids = None
 
         #self.kind = 'Deep Space object'  # TODO: distinguish between stars, galaxies...
-        #self.constellation = ''
-        ra_arr, dec_arr = self.dso.getCoords()
-        self.ra, self.dec = tuple(ra_arr), tuple(dec_arr)
-        self.alt_ids = self.dso.getIdentifiers()
-        self.constellation = self.dso.getConstellation()
-        self.kind = self.dso.getType()
-        self.star = Star(ra_hours=self.ra, dec_degrees=self.dec)
-        self.star_astro_now = self.astrometric = self.session.here.at(self.session.start).observe(self.star)
-        self.apparent = self.astrometric.apparent()
-
-        self.alt, self.az, self.distance = self.apparent.altaz('standard')
-
-        ra_arr, dec_arr = self.dso.getCoords()
-        self.ra, self.dec = tuple(ra_arr), tuple(dec_arr)
-        self.alt_ids = self.dso.getIdentifiers()
-        self.messier = self.alt_ids[0]
-        self.constellation = self.dso.getConstellation()
-        self.kind = self.dso.getType()
+        self.ra_hours = float(catalog.ra_hours[self.catalog_index])
+        self.dec_degrees = float(catalog.dec_degrees[self.catalog_index])
+        self.ra, self.dec = self.ra_hours, self.dec_degrees
+
+        # Alt/az values come from a batched DeepSpacePositions engine, usually
+        # shared by the whole session selection (see Session).
+        self.positions = None
+        self.index = None
+
+        self.magnitudes = {'V': float(catalog.vmag[self.catalog_index]),
+                           'B': float(catalog.bmag[self.catalog_index]),
+                           }
+        self.messier = catalog.messier_name(self.catalog_index)
+        self.is_bookmarked = self.catalog_index in session.bookmarks
+        self.constellation = catalog.constellation_abbrev(self.catalog_index)
+        self.kind = catalog.type_name(self.catalog_index)
         #logging.debug(self)
 
     @property
     def name(self):
-        return self.dso.getName()
+        return self.object_name
 
-    def update_coords(self):
-        pass
+    @property
+    def dso(self):
+        """The full pyongc object, only loaded from its database when needed."""
+        if self._dso is None:
+            from pyongc import ongc
 
-    def get_description(self):
-        pass
+            self._dso = ongc.Dso(self.object_name)
+        return self._dso
+
+    @property
+    def alt_ids(self):
+        if self._alt_ids is None:
+            self._alt_ids = self.dso.getIdentifiers()
+        return self._alt_ids
 
     def is_up_now(self):
         """Is this object above the horizon right now?"""
@@ -177,10 +212,38 @@ class DeepSpaceObserver(SpaceObserver):
         else:
             return False
 
-    def update_coords(self):
-        self.star_astro_now = self.session.here.at(self.session.ts.now()).observe(self.star)
-        self.apparent = self.astrometric.apparent()
-        self.alt, self.az, self.distance = self.apparent.altaz('standard') # NOTE: distance has no meaningful value here TODO
+    def calculate_rise_and_set(self):
+        """Get date/times for object rises, sets and transits during the
+        session, from the closed-form solver run by the session for its
+        whole deep space selection at once (see Session.get_object_events).
+        The session lists only need the solver arrays, so this is only
+        called when the dates are needed."""
+        events = self.session.get_object_events(self)
+        to_times = self.session.ts.tt_jd
+        self.session_rises = [to_times(jd) for jd in events.rises if not np.isnan(jd)]
+        self.session_sets = [to_times(jd) for jd in events.sets if not np.isnan(jd)]
+        self.session_transits = [to_times(jd) for jd in events.transits if not np.isnan(jd)]
+        self.up_at_session_start = bool(events.up_at_start)
+
+    def will_be_up_during_session(self):
+        """Will this object be above the horizon between start and end times?"""
+        return bool(self.session.get_object_events(self).up_during_session)
+
+    def will_be_visible_during_session(self):
+        """ Will this object be above the horizon between start and end times,
+        and not washed out by the Moon?"""
+        return self.will_be_up_during_session() and self.passes_moon_constraints()
+
+    def set_coords(self, alt_degrees, az_degrees):
+        self.alt, self.az = Angle(degrees=alt_degrees), Angle(degrees=az_degrees)
+        self.distance = None  # NOTE: distance has no meaningful value for these objects
+
+    def update_coords(self, t=None):
+        t = t if t is not None else self.session.now()
+        if self.positions is None:
+            DeepSpacePositions.from_observers([self])
+        alt, az = self.positions.update(self.session.here, t, indices=self.index)
+        self.set_coords(alt[0], az[0])
 
     def get_description(self):
         pass
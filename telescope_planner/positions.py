@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from skyfield.api import Star
+
+
+def sexagesimal_to_decimal(values):
+    """ Convert a (units, minutes, seconds) triplet, as returned by pyongc, to
+    a decimal value.
+
+    The sign is taken from the first element (including -0.0, which pyongc
+    returns for declinations between 0° and -1°), since the minutes and
+    seconds are always positive.
+    """
+    units, minutes, seconds = (float(v) for v in values)
+    sign = np.copysign(1.0, units)
+    return sign * (abs(units) + minutes / 60 + seconds / 3600)
+
+
+class DeepSpacePositions:
+    """ Batched position engine for a selection of fixed (deep space) objects.
+
+    All the RA/Dec values are kept in NumPy arrays, and a single array-valued
+    skyfield Star is built from them, so that alt/az for the whole selection
+    comes out of one observe/apparent/altaz call instead of one per object.
+    """
+
+    def __init__(self, ra_hours=(), dec_degrees=()):
+        self.ra_hours = np.asarray(ra_hours, dtype=float)
+        self.dec_degrees = np.asarray(dec_degrees, dtype=float)
+        self.star = Star(ra_hours=self.ra_hours, dec_degrees=self.dec_degrees) if len(self) else None
+        self.time = None
+        self.alt = np.full(len(self), np.nan)
+        self.az = np.full(len(self), np.nan)
+
+    @classmethod
+    def from_observers(cls, observers):
+        """Build an engine for a list of DeepSpaceObserver instances, binding
+        each one of them to its own row in the arrays."""
+        engine = cls(ra_hours=[obj.ra_hours for obj in observers],
+                     dec_degrees=[obj.dec_degrees for obj in observers])
+        for i, obj in enumerate(observers):
+            obj.positions, obj.index = engine, i
+        return engine
+
+    def __len__(self):
+        return len(self.ra_hours)
+
+    def update(self, here, t, indices=None):
+        """ Compute alt/az (in degrees) at time t for all the objects, or only
+        for the rows in indices, in a single batched call.
+        """
+        if indices is None:
+            rows, star = slice(None), self.star
+        else:
+            rows = np.atleast_1d(indices)
+            star = Star(ra_hours=self.ra_hours[rows], dec_degrees=self.dec_degrees[rows])
+
+        if len(self.ra_hours[rows]):
+            alt, az, _ = here.at(t).observe(star).apparent().altaz('standard')
+            self.alt[rows], self.az[rows] = alt.degrees, az.degrees
+        if indices is None:
+            self.time = t
+        return self.alt[rows], self.az[rows]
+
+    def radec_of_date(self, here, t):
+        """Apparent RA (hours) and Dec (degrees) of date, for all the objects,
+        as seen from here at time t, in a single batched call."""
+        if not len(self):
+            return self.ra_hours.copy(), self.dec_degrees.copy()
+        # Rotating the positions with the precession-nutation matrix of t is
+        # much cheaper here than radec(epoch='date') on an array-valued Star.
+        observer = here.at(t)
+        x, y, z = observer.t.M.dot(observer.observe(self.star).apparent().position.au)
+        ra_hours = np.degrees(np.arctan2(y, x)) / 15.0 % 24.0
+        return ra_hours, np.degrees(np.arctan2(z, np.hypot(x, y)))
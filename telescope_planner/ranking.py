@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Scoring and top-K selection of deep space objects for a session.
+
+Each catalog row gets a score between 0 and 1 from its best altitude during
+the session (as 1/airmass), its magnitude against the instrument limit, its
+surface brightness and the moonlight at its best time, plus a bonus for
+bookmarked objects. Scores are computed with array operations on the catalog
+columns, one chunk of rows at a time, and only the best K rows are kept in a
+bounded heap, so that no observer object is created for the rest.
+"""
+import heapq
+
+import numpy as np
+
+from telescope_planner.constraints import BRIGHT_SURFACE, FAINT_SURFACE
+from telescope_planner.constraints import moon_separation_degrees, moon_track, moonlight_penalty
+from telescope_planner.events import SIDEREAL_DEGREES_PER_DAY, time_grid
+from telescope_planner.settings import DEFAULT_MIN_MAG, VISIBILITY_STEP_MINUTES
+from telescope_planner.skymath import hadec_to_altaz, local_sidereal_degrees, refract, standard_pressure
+
+WEIGHTS = {'altitude': 0.35,
+           'magnitude': 0.30,
+           'surface_brightness': 0.15,
+           'moon': 0.20,
+           }
+BOOKMARK_BONUS = 1.0
+
+# Magnitudes below the instrument limit that give a full magnitude score:
+MAGNITUDE_RANGE = 8.0
+# Surface brightness gives a full score at constraints.BRIGHT_SURFACE, and a
+# null one at FAINT_SURFACE. Objects without one (stars, most clusters) are
+# not diffuse, and get a full score.
+
+CHUNK_ROWS = 4096
+
+
+class RankingContext:
+    """ Everything the scores depend on, besides the catalog rows: session
+    location and window, instrument limit, Moon track and bookmarks."""
+
+    def __init__(self, session, limit_mag=None, bookmarks=()):
+        self.latitude = session.latitude
+        self.min_alt = session.min_alt
+        self.pressure = standard_pressure(session.altitude)
+        self.start_jd = session.start.tt
+        self.span = session.end.tt - session.start.tt
+        self.lst_start = local_sidereal_degrees(session.start, session.longitude)
+        self.limit_mag = limit_mag if limit_mag is not None else (session.min_apparent_mag or DEFAULT_MIN_MAG)
+        self.bookmarks = np.array(sorted(bookmarks), dtype=int)
+
+        times = time_grid(session.ts, session.start, session.end, VISIBILITY_STEP_MINUTES)
+        self.moon_jd = np.atleast_1d(times.tt)
+        self.moon_alt, self.moon_az, self.illumination = (np.atleast_1d(v) for v in moon_track(session, times))
+
+
+def best_altitude(ra_hours, dec_degrees, context):
+    """ Highest (geometric) altitude of each object during the session, and
+    the TT Julian date when it happens: the transit, if it falls inside the
+    session window, or else whichever end of the window is higher."""
+    drift = context.span * SIDEREAL_DEGREES_PER_DAY
+    ha_start = (context.lst_start - ra_hours * 15.0 + 180.0) % 360.0 - 180.0
+    to_transit = np.where(ha_start <= 0.0, -ha_start, 360.0 - ha_start)
+    alt_start, _ = hadec_to_altaz(ha_start, dec_degrees, context.latitude)
+    alt_end, _ = hadec_to_altaz(ha_start + drift, dec_degrees, context.latitude)
+
+    transits = to_transit <= drift
+    best_ha = np.where(transits, 0.0, np.where(alt_end > alt_start, ha_start + drift, ha_start))
+    alt, az = hadec_to_altaz(best_ha, dec_degrees, context.latitude)
+    jd = context.start_jd + ((best_ha - ha_start) % 360.0) / SIDEREAL_DEGREES_PER_DAY
+    return alt, az, jd
+
+
+def score_rows(catalog, rows, context):
+    """ Scores for the given catalog rows (NaN for the objects that never get
+    above the session minimum altitude, with refraction)."""
+    ra, dec = catalog.ra_hours[rows], catalog.dec_degrees[rows]
+    alt, az, jd = best_altitude(ra, dec, context)
+    altitude = np.sin(np.radians(np.clip(alt, 0.0, 90.0)))  # 1 / airmass
+
+    mag = catalog.vmag[rows]
+    mag = np.where(np.isnan(mag), catalog.bmag[rows], mag)
+    magnitude = np.nan_to_num(np.clip((context.limit_mag - mag) / MAGNITUDE_RANGE, 0.0, 1.0))
+
+    surface = catalog.surface_brightness[rows].astype(float)
+    surface = np.where(np.isnan(surface), 1.0,
+                       np.clip((FAINT_SURFACE - surface) / (FAINT_SURFACE - BRIGHT_SURFACE), 0.0, 1.0))
+
+    step = np.clip(np.searchsorted(context.moon_jd, jd), 0, len(context.moon_jd) - 1)
+    separation = moon_separation_degrees(alt, az, context.moon_alt[step], context.moon_az[step])
+    moon = 1.0 - moonlight_penalty(separation, context.moon_alt[step], context.illumination[step])
+
+    score = (WEIGHTS['altitude'] * altitude + WEIGHTS['magnitude'] * magnitude
+             + WEIGHTS['surface_brightness'] * surface + WEIGHTS['moon'] * moon)
+    score = score + BOOKMARK_BONUS * np.isin(rows, context.bookmarks)
+    return np.where(refract(alt, pressure_mbar=context.pressure) >= context.min_alt, score, np.nan)
+
+
+def top_k(catalog, context, k, chunks):
+    """ Stream over chunks of catalog rows, keeping the k best scores in a
+    bounded min-heap. Returns (score, row) pairs, best first."""
+    if k <= 0:
+        return []
+    heap = []
+    for rows in chunks:
+        if not len(rows):
+            continue
+        scores = score_rows(catalog, rows, context)
+        valid = np.flatnonzero(~np.isnan(scores))
+        if len(valid) > k:
+            # Only the best k of each chunk can make it into the heap:
+            valid = valid[np.argpartition(scores[valid], -k)[-k:]]
+        for score, row in zip(scores[valid].tolist(), rows[valid].tolist()):
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -row))
+            elif score > heap[0][0]:
+                heapq.heapreplace(heap, (score, -row))
+    return [(score, -row) for score, row in sorted(heap, reverse=True)]
+
+
+def row_chunks(count, chunk_rows=CHUNK_ROWS):
+    """Consecutive row index ranges covering count rows, chunk_rows at a time."""
+    for first in range(0, count, chunk_rows):
+        yield np.arange(first, min(first + chunk_rows, count))
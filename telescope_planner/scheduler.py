@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Observing run scheduler.
+
+Orders a set of session objects into consecutive time slots, from session
+start to end, trying to get the most total score out of the night, while
+paying for the telescope slew between targets and a fixed setup time per
+target. Positions at any time come from the session visibility matrix, so
+no ephemeris is computed here.
+
+The plan is built greedily (at each step, the feasible target with the best
+score × 1/airmass per minute spent), then the order is improved with 2-opt
+moves that reduce the total slew, keeping only the moves for which every
+target is still inside the alt/az window for its whole slot. The time saved
+is then filled greedily again.
+"""
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from telescope_planner.skymath import is_inside_altaz_window
+
+SETUP_MINUTES = 5.0
+OBSERVE_MINUTES = 15.0
+
+# Typical GoTo mount slew speed (both axes move at once) and settle time:
+SLEW_DEGREES_PER_SECOND = 3.0
+SETTLE_SECONDS = 10.0
+
+# Time allowed for the 2-opt improvement stage, in seconds:
+TIME_BUDGET_SECONDS = 0.5
+
+
+class _Targets:
+    """Alt/az tracks (from the visibility matrix) of the candidate objects."""
+
+    def __init__(self, session, objects):
+        matrix = session.visibility
+        rows = [matrix.row(obj) for obj in objects]
+        self.objects = [obj for obj, row in zip(objects, rows) if row is not None]
+        rows = np.array([row for row in rows if row is not None], dtype=int)
+        self.alt = matrix.alt[rows].astype(float)
+        self.az = matrix.az[rows].astype(float)
+        self.scores = np.array([obj.score for obj in self.objects], dtype=float)
+        self.jd0 = matrix.jd[0]
+        self.step = (matrix.jd[-1] - matrix.jd[0]) / max(len(matrix.jd) - 1, 1)
+        self.window = (session.min_alt, session.max_alt, session.min_az, session.max_az)
+
+    def __len__(self):
+        return len(self.objects)
+
+    def altaz(self, targets, jd):
+        """Alt/az of the targets at the given Julian dates, linearly interpolated."""
+        position = np.clip((np.asarray(jd) - self.jd0) / self.step, 0.0, self.alt.shape[1] - 1.0)
+        first = np.minimum(position.astype(int), self.alt.shape[1] - 2)
+        weight = position - first
+        second = np.minimum(first + 1, self.alt.shape[1] - 1)
+        alt = self.alt[targets, first] * (1 - weight) + self.alt[targets, second] * weight
+        d_az = (self.az[targets, second] - self.az[targets, first] + 180.0) % 360.0 - 180.0
+        return alt, (self.az[targets, first] + d_az * weight) % 360.0
+
+    def inside(self, targets, jd):
+        alt, az = self.altaz(targets, jd)
+        return is_inside_altaz_window(alt, az, *self.window)
+
+
+def slew_seconds(alt1, az1, alt2, az2, rate=SLEW_DEGREES_PER_SECOND):
+    """Slew time between alt/az positions, for a mount moving both axes at once."""
+    d_az = np.abs((np.asarray(az2) - az1 + 180.0) % 360.0 - 180.0)
+    return np.maximum(np.abs(np.asarray(alt2) - alt1), d_az) / rate + SETTLE_SECONDS
+
+
+class _Planner:
+    def __init__(self, targets, start, end, setup_minutes, observe_minutes, slew_rate):
+        self.targets = targets
+        self.start, self.end = start, end
+        self.setup = setup_minutes / 1440.0
+        self.observe = observe_minutes / 1440.0
+        self.slew_rate = slew_rate
+
+    def _slew(self, previous, targets, jd):
+        if previous is None:
+            return np.zeros(len(targets))
+        alt1, az1 = self.targets.altaz(np.array([previous]), jd)
+        alt2, az2 = self.targets.altaz(targets, jd)
+        return slew_seconds(alt1, az1, alt2, az2, self.slew_rate)
+
+    def timeline(self, order):
+        """ Slot times for the targets in this order, each one starting as
+        soon as possible: like greedy, when a target is not inside the
+        window yet, wait for it one time step at a time. Returns (slews,
+        begins, feasible), where slews and begins stop at the first target
+        that does not fit before the session end, if any."""
+        targets = self.targets
+        t, previous = self.start, None
+        slews, begins = [], []
+        for target in order:
+            while True:
+                slew = 0.0
+                if previous is not None:
+                    alt1, az1 = targets.altaz(previous, t)
+                    alt2, az2 = targets.altaz(target, t)
+                    slew = float(slew_seconds(alt1, az1, alt2, az2, self.slew_rate))
+                begin = t + slew / 86400.0 + self.setup
+                end = begin + self.observe
+                if end > self.end:
+                    return slews, begins, False
+                if targets.inside(target, np.array([begin, end])).all():
+                    break
+                t += targets.step
+            slews.append(slew)
+            begins.append(begin)
+            t, previous = end, target
+        return slews, begins, True
+
+    def greedy(self, order=()):
+        """ Extend the given order with the best feasible targets, one at a
+        time, from the end of its last slot until the session end."""
+        slews, begins, _ = self.timeline(order)
+        order = list(order)[:len(begins)]
+        t = begins[-1] + self.observe if begins else self.start
+        remaining = np.setdiff1d(np.arange(len(self.targets)), order)
+        while len(remaining) and t < self.end:
+            previous = order[-1] if order else None
+            slew = self._slew(previous, remaining, t)
+            begin = t + slew / 86400.0 + self.setup
+            end = begin + self.observe
+            feasible = ((end <= self.end) & self.targets.inside(remaining, begin)
+                        & self.targets.inside(remaining, end))
+            if not feasible.any():
+                # Nothing can be observed right now, so wait for objects to rise:
+                t += self.targets.step
+                continue
+            alt, _ = self.targets.altaz(remaining, begin)
+            gain = self.targets.scores[remaining] * np.sin(np.radians(np.clip(alt, 0.0, 90.0))) / (end - t)
+            best = np.flatnonzero(feasible)[np.argmax(gain[feasible])]
+            order.append(int(remaining[best]))
+            t = end[best]
+            remaining = np.delete(remaining, best)
+        return order
+
+    def two_opt(self, order, deadline):
+        """ Reverse order segments while this shortens the total slew and
+        keeps the plan feasible, until no move helps or the deadline is
+        reached. All the moves are screened at once with the slews between
+        the positions at the current slot times, and the most promising ones
+        are then checked on the actual timeline."""
+        n = len(order)
+        if n < 4:
+            return order
+        i, j = np.arange(n - 2)[:, np.newaxis], np.arange(n)[np.newaxis, :]
+        valid = j >= i + 2
+        has_tail = j + 1 < n
+        j_next = np.minimum(j + 1, n - 1)
+        while time.perf_counter() < deadline:
+            slews, begins, _ = self.timeline(order)
+            alt, az = self.targets.altaz(np.array(order), np.array(begins))
+            cost = slew_seconds(alt[:, np.newaxis], az[:, np.newaxis], alt, az, self.slew_rate)
+            delta = (cost[i, j] + np.where(has_tail, cost[i + 1, j_next], 0.0)
+                     - cost[i, i + 1] - np.where(has_tail, cost[j, j_next], 0.0))
+            moves = np.flatnonzero(valid & (delta < -1e-6))
+            for move in moves[np.argsort(delta.ravel()[moves])]:
+                first, last = divmod(int(move), n)
+                candidate = order[:first + 1] + order[first + 1:last + 1][::-1] + order[last + 1:]
+                candidate_slews, _, feasible = self.timeline(candidate)
+                if feasible and sum(candidate_slews) < sum(slews) - 1e-6:
+                    order = candidate
+                    break
+                if time.perf_counter() >= deadline:
+                    return order
+            else:
+                return order
+        return order
+
+
+def plan_session(session, objects, setup_minutes=SETUP_MINUTES, observe_minutes=OBSERVE_MINUTES,
+                 slew_rate=SLEW_DEGREES_PER_SECOND, time_budget=TIME_BUDGET_SECONDS):
+    """ Build a timed observing plan for the given session objects (which
+    must be in the session visibility matrix, and have their score set).
+
+    Returns a list of SimpleNamespace(object, start, end, slew_seconds, alt,
+    az, score), one per slot, in observing order, where start and end are
+    skyfield Time objects, and alt/az (degrees) are taken at the slot start.
+    """
+    deadline = time.perf_counter() + time_budget
+    targets = _Targets(session, objects)
+    planner = _Planner(targets, session.start.tt, session.end.tt, setup_minutes, observe_minutes, slew_rate)
+    order = planner.greedy()
+    order = planner.greedy(planner.two_opt(order, deadline))
+
+    slews, begins, _ = planner.timeline(order)
+    order = order[:len(begins)]
+    alt, az = targets.altaz(np.array(order, dtype=int), np.array(begins))
+    plan = []
+    for i, target in enumerate(order):
+        plan.append(SimpleNamespace(object=targets.objects[target],
+                                    start=session.ts.tt_jd(begins[i]),
+                                    end=session.ts.tt_jd(begins[i] + planner.observe),
+                                    slew_seconds=slews[i],
+                                    alt=float(alt[i]),
+                                    az=float(az[i]),
+                                    score=float(targets.scores[target])))
+    return plan
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Annual visibility calendar: how many hours of astronomical night each object
+spends above a given altitude, for every night of a year, at one site.
+
+Each night is an interval of local sidereal time (from astronomical dusk to
+dawn), and each object is above the altitude threshold during a fixed
+interval of sidereal time around its right ascension. The visible time is
+the length of the intersection of both circular intervals, so the whole
+objects × nights array comes from a few array operations, after one batched
+dusk/dawn computation for the year (see events.dark_windows).
+"""
+import calendar
+from types import SimpleNamespace
+
+import numpy as np
+
+from skyfield.api import Topos
+
+from telescope_planner.events import SIDEREAL_DEGREES_PER_DAY, dark_windows
+from telescope_planner.positions import DeepSpacePositions
+from telescope_planner.skymath import local_sidereal_degrees
+from telescope_planner.visibility import ROWS_PER_BLOCK
+
+SEASON_MIN_ALT = 30.0
+SEASON_TWILIGHT = 'astronomical'
+
+
+def arc_overlap(start_a, length_a, start_b, length_b):
+    """ Length of the intersection of circular arcs (degrees, each given by
+    its start and a length up to 360), elementwise."""
+    d = (start_b - start_a) % 360.0
+    direct = np.maximum(0.0, np.minimum(length_a, d + length_b) - d)
+    wrapped = np.maximum(0.0, np.minimum(length_a, d + length_b - 360.0))
+    return direct + wrapped
+
+
+class SeasonCalendar:
+    """ Dark hours above min_alt for catalog rows (one per row of hours)
+    over consecutive nights (one per column)."""
+
+    def __init__(self, catalog, rows, year, nights, dusk, dawn, hours, latitude, longitude, min_alt):
+        self.catalog = catalog
+        self.rows = rows
+        self.year = year
+        self.nights = nights
+        self.dusk = dusk
+        self.dawn = dawn
+        self.hours = hours
+        self.latitude = latitude
+        self.longitude = longitude
+        self.min_alt = min_alt
+        self._row_index = {int(row): i for i, row in enumerate(rows)}
+
+        # Calendar month of each night, taken at local noon before it starts:
+        first_day = np.datetime64(f'{year}-01-01')
+        days = first_day + np.arange(len(nights)).astype('timedelta64[D]')
+        self.months = days.astype('datetime64[M]').astype(int) % 12 + 1
+
+    def index(self, obj):
+        """Position in this calendar of an object, given by name or catalog row."""
+        row = self.catalog.index_of(obj) if isinstance(obj, str) else int(obj)
+        if row not in self._row_index:
+            raise ValueError(f'Object {obj} is not in this season calendar.')
+        return self._row_index[row]
+
+    def monthly_hours(self, obj=None):
+        """Dark hours above min_alt per calendar month (12 columns), for one object or all."""
+        hours = self.hours if obj is None else self.hours[self.index(obj)][np.newaxis]
+        monthly = np.stack([hours[:, self.months == month].sum(axis=1) for month in range(1, 13)], axis=1)
+        return monthly if obj is None else monthly[0]
+
+    def best_month(self, obj):
+        """ The calendar month (1-12) with the most dark hours above min_alt
+        for an object, with its name and total hours."""
+        monthly = self.monthly_hours(obj)
+        month = int(np.argmax(monthly)) + 1
+        return SimpleNamespace(month=month, name=calendar.month_name[month], hours=float(monthly[month - 1]))
+
+    def best_nights(self, obj, count=10):
+        """Dates (local noon before each night) of the count best nights for an object, best first."""
+        hours = self.hours[self.index(obj)]
+        best = np.argsort(-hours, kind='stable')[:count]
+        days = np.datetime64(f'{self.year}-01-01') + best.astype('timedelta64[D]')
+        return [(str(day), float(hours[i])) for day, i in zip(days, best)]
+
+    def good_this_month(self, month, min_hours=1.0, count=None):
+        """ Catalog rows of the objects with at least min_hours of dark time
+        above min_alt on an average night of the month, most hours first
+        (and brightest first, for the same hours)."""
+        nights = max(int((self.months == month).sum()), 1)
+        average = self.monthly_hours()[:, month - 1] / nights
+        order = np.lexsort((self.catalog.vmag[self.rows], -np.round(average, 2)))
+        order = order[average[order] >= min_hours][0:count]
+        return self.rows[order]
+
+
+def compute_season(catalog, ts, ephemeris, latitude, longitude, year, rows=None, min_alt=SEASON_MIN_ALT,
+                   twilight=SEASON_TWILIGHT):
+    """ Build the SeasonCalendar of a year (every night that starts in it)
+    for the given catalog rows (by default, the whole catalog, without
+    duplicated records or objects without coordinates).
+
+    Object coordinates are taken as apparent RA/Dec of date at mid-year. The
+    altitude threshold is geometric (refraction is negligible above a few
+    degrees). Hours are stored as float32.
+    """
+    rows = np.asarray(rows if rows is not None else np.sort(catalog.query()), dtype=int)
+    n_nights = 366 if calendar.isleap(year) else 365
+    here = ephemeris['earth'] + Topos(latitude_degrees=latitude, longitude_degrees=longitude)
+
+    # The first night is the one that starts at local noon on January 1st:
+    first_noon = ts.utc(year, 1, 1, 12.0 - longitude / 15.0)
+    windows = dark_windows(ts, ephemeris, latitude, longitude, first_noon, n_nights, twilight)
+    dusk, dawn = windows.dusk, windows.dawn
+    has_night = ~np.isnan(dusk) & ~np.isnan(dawn)
+    night_start = np.where(has_night, local_sidereal_degrees(ts.tt_jd(np.nan_to_num(dusk, nan=first_noon.tt)),
+                                                             longitude), 0.0)
+    night_length = np.where(has_night, np.minimum((dawn - dusk) * SIDEREAL_DEGREES_PER_DAY, 360.0), 0.0)
+
+    ra, dec = DeepSpacePositions(catalog.ra_hours[rows], catalog.dec_degrees[rows]).radec_of_date(
+        here, ts.utc(year, 7, 2))
+    lat = np.radians(latitude)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_h0 = ((np.sin(np.radians(min_alt)) - np.sin(lat) * np.sin(np.radians(dec)))
+                  / (np.cos(lat) * np.cos(np.radians(dec))))
+    semi_arc = np.degrees(np.arccos(np.clip(np.nan_to_num(cos_h0, nan=1.0), -1.0, 1.0)))
+    up_start, up_length = ra * 15.0 - semi_arc, 2.0 * semi_arc
+
+    hours = np.empty((len(rows), n_nights), dtype=np.float32)
+    for first in range(0, len(rows), ROWS_PER_BLOCK):
+        block = slice(first, first + ROWS_PER_BLOCK)
+        overlap = arc_overlap(night_start, night_length, up_start[block, np.newaxis], up_length[block, np.newaxis])
+        hours[block] = overlap / SIDEREAL_DEGREES_PER_DAY * 24.0
+
+    return SeasonCalendar(catalog, rows, year, windows.nights, dusk, dawn, hours, latitude, longitude, min_alt)
@@ -3,16 +3,32 @@ import logging
 
 from types import SimpleNamespace
 
-from pyongc.ongc import listObjects
-from skyfield.api import Loader, Topos, load
-from astropy.coordinates import Angle
+import numpy as np
 
+from skyfield.api import Topos
+
+from telescope_planner.catalog import get_catalog
+from telescope_planner.clock import SystemClock
+from telescope_planner.constraints import compute_moon_constraints
 from telescope_planner.constants import DEFAULT_LOCATION, SOLAR_SYSTEM
 from telescope_planner.constants import ONGC_CATALOGS_ABREVS_FROM_NAMES, CONSTELLATIONS_ABBREV_FROM_LATIN
 from telescope_planner.constants import ONGC_TYPES_ABREVS_FROM_NAMES
+from telescope_planner.ephemeris import ObserverCache, get_ephemeris, get_timescale
+from telescope_planner.events import dark_windows, find_solar_system_events, fixed_object_events, next_dark_window
 from telescope_planner.geocode import get_location
+from telescope_planner.instrumentation import PhaseTimer
+from telescope_planner.interpolation import fit_chebyshev_tables
+from telescope_planner.live import LIVE_DRIFT_SECONDS, LiveSky
 from telescope_planner.observers import PlanetObserver, DeepSpaceObserver
-from telescope_planner.settings import DATA_FOLDER
+from telescope_planner.positions import DeepSpacePositions
+from telescope_planner.ranking import RankingContext, row_chunks, score_rows, top_k
+from telescope_planner.scheduler import plan_session
+from telescope_planner.skyindex import WINDOW_MARGIN, get_sky_index
+from telescope_planner.settings import SESSION_TWILIGHT, STREAM_BATCH_SIZE, TIME_LAPSE_STEP_MINUTES
+from telescope_planner.settings import VISIBILITY_STEP_MINUTES
+from telescope_planner.skymath import is_inside_altaz_window
+from telescope_planner.store import get_store
+from telescope_planner.visibility import compute_altaz, compute_visibility
 
 
 def is_float(value):
@@ -23,23 +39,35 @@ def is_float(value):
         return False
 
 
-def get_dso_list(catalog=None, kind=None, constellation=None, uptovmag=None, limit=None):
+def get_dso_list(catalog=None, kind=None, constellation=None, uptovmag=None, limit=None, snapshot=None,
+                 min_ra=None, min_dec=None, max_ra=None, max_dec=None, subset=None):
+    """ Select objects from the catalog snapshot, returning their row indices,
+    brightest first. All the predicates are evaluated inside the catalog store
+    (see CatalogSnapshot.query), and limit is only applied after them.
+    """
+    snapshot = snapshot if snapshot is not None else get_catalog()
     params = dict()
 
     if (catalog is not None) and (catalog in ONGC_CATALOGS_ABREVS_FROM_NAMES.keys()):
         params.update({'catalog': ONGC_CATALOGS_ABREVS_FROM_NAMES[catalog]})
 
-    if (kind is not None) and (kind in ONGC_TYPES_ABREVS_FROM_NAMES.keys()):
-        params.update({'type': ONGC_TYPES_ABREVS_FROM_NAMES[kind]})
+    if kind is not None:
+        code = snapshot.type_code(kind)
+        if code is None and kind in ONGC_TYPES_ABREVS_FROM_NAMES.keys():
+            code = snapshot.type_code(ONGC_TYPES_ABREVS_FROM_NAMES[kind])
+        if code is not None:
+            params.update({'type_code': code})
 
-    if (constellation is not None) and (constellation in CONSTELLATIONS_ABBREV_FROM_LATIN.keys()):
-        params.update({'constellation': CONSTELLATIONS_ABBREV_FROM_LATIN[constellation]})
+    if constellation is not None:
+        code = snapshot.constellation_code(CONSTELLATIONS_ABBREV_FROM_LATIN.get(constellation, constellation))
+        if code is not None:
+            params.update({'constellation_code': code})
 
     if uptovmag is not None and is_float(uptovmag):
         params.update({'uptovmag': float(uptovmag)})
 
-    return [obj for obj in listObjects(**params)[0:limit]
-            if obj.getType() != "Duplicated record"]
+    return snapshot.query(min_ra=min_ra, max_ra=max_ra, min_dec=min_dec, max_dec=max_dec,
+                          subset=subset, limit=limit, **params)
 
 
 def radec2deg(ra='', dec=''):
@@ -74,68 +102,20 @@ def radec2deg(ra='', dec=''):
         return ra_deg or dec_deg
 
 
-def is_inside_window(obj, min_ra, min_dec, max_ra, max_dec):
-    ra, dec = radec2deg(ra=obj.getRA(), dec=obj.getDec())
-    min_ra_deg, max_ra_deg = min_ra._degrees, max_ra._degrees
-    min_dec_deg, max_dec_deg = min_dec._degrees, max_dec._degrees
-
-    #for ang in [ra, dec, min_ra_deg, max_ra_deg, min_dec_deg, max_dec_deg]:
-    #    if ang._degrees < 0.0:
-    #        ang += 360
-
-    ra_angle = Angle(f'{ra}d')
-    dec_angle = Angle(f'{dec}d')
-
-
-    print("============", obj, "============", )
-    print("RA      ", ra, type(ra))
-    print("DEC     ", dec, type(dec))
-    print("")
-    print("minRA   ", min_ra, type(min_ra))
-    print("minDEC  ", min_dec, type(min_dec))
-    print("")
-    print("MAXRA   ", max_ra, type(max_ra))
-    print("MAXDEC  ", max_dec, type(max_dec))
-    print("")
-    print("minRA  °", min_ra_deg, type(min_ra))
-    print("minDEC °", min_dec, type(min_dec))
-    print("")
-    print("MAXRA ° ", max_ra_deg, type(max_ra_deg))
-    print("MAXDEC° ", max_dec_deg, type(max_dec_deg))
-    print("")
-    print("rangle  ", ra_angle, type(ra_angle))
-    print("decangle", dec_angle, type(dec_angle))
-
-    if ra_angle.is_within_bounds(lower=f'{min_ra_deg}d', upper=f'{max_ra_deg}d'):
-        pass
-        print("RA within bounds!", ra_angle, min_ra_deg, max_ra_deg,ra_angle.is_within_bounds(lower=f'{min_ra_deg}d', upper=f'{max_ra_deg}d'))
-    else:
-        pass
-        print("RA out of bounds!")
-
-    if dec_angle.is_within_bounds(lower=f'{min_dec_deg}d', upper=f'{max_dec_deg}d'):
-        print("Declination within bounds:", ra_angle, min_ra_deg, max_ra_deg, ra_angle.is_within_bounds(lower=f'{min_ra_deg}d', upper=f'{max_ra_deg}d'))
-    else:
-        pass
-        print("Declination out of bounds!")
-
-"""
-        print(f'In:  {obj}')
-        return True
-    else:
-        print(f'Out: {obj}')
-        return False
-"""
-
 class Session:
     def __init__(self, timescale=None, start=None, end=None, latitude=DEFAULT_LOCATION.latitude,
                  longitude=DEFAULT_LOCATION.longitude, altitude=DEFAULT_LOCATION.altitude, min_alt=0.0, max_alt=90.0,
                  min_az=0.0, max_az=360.0, constellation=None, only_kind=None, min_apparent_mag=None,
-                 only_from_catalog=None, only_these_sources=None, limit=None):
-        self.start = start if start is not None else get_next_sunset()
-        self.end = end if end is not None else get_next_sunrise()
+                 only_from_catalog=None, only_these_sources=None, limit=None, ephemeris=None, bookmarks=None,
+                 stream=False, instrument=False, clock=None, use_store=True):
+        # Wall time, calls and objects per phase, see the timings property:
+        self.timer = PhaseTimer(enabled=instrument)
 
-        self.ts = timescale
+        # Timescale and ephemeris are shared by all the sessions in the process,
+        # unless specific ones are given:
+        self.ts = timescale if timescale is not None else get_timescale()
+        # Where "now" comes from (see the clock module), the wall clock by default:
+        self.clock = clock if clock is not None else SystemClock()
 
         # user/observatory location:
         self.latitude = latitude
@@ -164,77 +144,249 @@ class Session:
         self.objects_not_visible_during_session = SimpleNamespace(**{'planets': [], 'deepspace': []})
         self.objects_not_defined_during_session = SimpleNamespace(**{'planets': [], 'deepspace': []})
 
-        load = Loader(DATA_FOLDER)
-        self.planets = load('de421.bsp')
+        self.catalog = get_catalog()
+        # Answer from the precomputed visibility store for this site, when there is one (see store.py):
+        self.use_store = use_store
+
+        # Bookmarked deep space objects (names or catalog rows), favoured by the ranking:
+        self.bookmarks = {self.catalog.index_of(obj) if isinstance(obj, str) else int(obj)
+                          for obj in (bookmarks or [])}
+
+        self.planets = ephemeris if ephemeris is not None else get_ephemeris()
         self.earth = self.planets['earth']
-        self.here = self.earth + Topos(latitude=f'{self.latitude} N',
-                                       longitude=f'{self.longitude} E',
-                                       elevation_m=self.altitude)
+        # Observer state is computed once per instant, and shared by all the objects (see observer_at):
+        self.here = ObserverCache(self.earth + Topos(latitude=f'{self.latitude} N',
+                                                     longitude=f'{self.longitude} E',
+                                                     elevation_m=self.altitude))
 
         # Use minimum altitude/azimuth provided for this session (depending for
         # instance on the telescope mount angles or any physical obstacles on
-        # the observatory), define a window constraint converting from alt/az to ra/dec,
-        # for current location/datetime:
-        # ts = load.timescale()
-        # planets = load('de421.bsp')
-        # earth = planets['earth']
-
-        self.moment = self.ts.now()
+        # the observatory), to define an alt/az window constraint, checked for
+        # the current location/datetime against the catalog sky index:
+
+        self.moment = self.now()
+
+        # By default, the session runs through the current or next night:
+        self.start, self.end = start, end
+        if start is None:
+            dusk = self.get_next_sunset()
+            self.start = self.ts.tt_jd(max(dusk.tt, self.moment.tt)) if dusk is not None else self.moment
+        if end is None:
+            dawn = self.get_next_sunrise(after=self.start)
+            self.end = dawn if dawn is not None else self.ts.tt_jd(self.start.tt + 0.5)
         # self.here = earth + Topos(latitude=f'{self.latitude} N',
         #                     longitude=f'{self.longitude} E',
         #                     elevation_m=self.altitude)
 
-        self.min_ra, self.min_dec, _ = self.here.at(self.moment).from_altaz(alt_degrees=min_alt, az_degrees=min_az).radec()
-        self.max_ra, self.max_dec, _ = self.here.at(self.moment).from_altaz(alt_degrees=max_alt, az_degrees=max_az).radec()
+        self.min_alt, self.max_alt = min_alt, max_alt
+        self.min_az, self.max_az = min_az, max_az
 
         self.update_user_location(self.latitude, self.longitude)
+        self.solar_system_events = {}
+        self.solar_system_tables = {}
+        self.deepspace_events = {}
+        self.visibility = None
+        self.moon_constraints = None
         self.deepspace_selection = []
-
-        if self.only_these_sources is not None:
-            if self.only_these_sources.planets:
-                logging.debug("=== Using our Top List for Solar System")  # DEBUG
-                self.solar_system = [PlanetObserver(name, self)
-                                     for name in self.only_these_sources.planets]
-            else:
-                logging.debug("=== Using All Planets from Solar System")  # DEBUG
-                self.solar_system = [PlanetObserver(name, self) for name in SOLAR_SYSTEM]
+        self.deepspace_positions = DeepSpacePositions()
+
+        if stream:
+            # Nothing is selected or computed yet, see iter_visible():
+            self.solar_system = []
+        elif self.only_these_sources is not None:
+            with self.timer.phase('observer_construction') as phase:
+                if self.only_these_sources.planets:
+                    logging.debug("=== Using our Top List for Solar System")  # DEBUG
+                    self.solar_system = [PlanetObserver(name, self)
+                                         for name in self.only_these_sources.planets]
+                else:
+                    logging.debug("=== Using All Planets from Solar System")  # DEBUG
+                    self.solar_system = [PlanetObserver(name, self) for name in SOLAR_SYSTEM]
+                phase.objects = len(self.solar_system)
 
             if self.only_these_sources.deepspace:
                 logging.debug("=== Using our Top List for Solar System")  # DEBUG
-                for obj_id in self.only_these_sources.deepspace:
-                    try:
-                        self.deepspace_selection.append(DeepSpaceObserver(obj_id, self))
-                    except ValueError as e:
-                        logging.warning(e)
+                with self.timer.phase('observer_construction') as phase:
+                    for obj_id in self.only_these_sources.deepspace:
+                        try:
+                            self.deepspace_selection.append(DeepSpaceObserver(obj_id, self))
+                        except ValueError as e:
+                            logging.warning(e)
+                    phase.objects = len(self.deepspace_selection)
             else:
                 logging.debug("=== Not using Deep Space this time")  # DEBUG
                 self.deepspace_selection = []
+            self.update_deepspace_positions()
         else:
             logging.debug("=== Using our All Planets for Solar System")  # DEBUG
-            self.solar_system = [PlanetObserver(name, self) for name in SOLAR_SYSTEM]
+            with self.timer.phase('observer_construction', len(SOLAR_SYSTEM)):
+                self.solar_system = [PlanetObserver(name, self) for name in SOLAR_SYSTEM]
             logging.debug(
                 f"=== Using session parameters for Deep Space {only_from_catalog} {only_kind} {constellation} {min_apparent_mag} {self.limit}")  # DEBUG
-            selection = get_dso_list(catalog=only_from_catalog,
-                                      kind=only_kind,
-                                      constellation=constellation,
-                                      uptovmag=min_apparent_mag,
-                                      limit=self.limit,
-                                      # TODO: Add min_ra, min_dec, max_ra, max_dec here
-                                      )
-
-            selection_filtered = [obj for obj in selection
-                                  if is_inside_window(obj, self.min_ra, self.min_dec, self.max_ra, self.max_dec, )]
-
-            for obj in selection_filtered:
-                try:
-                    self.deepspace_selection.append(DeepSpaceObserver(obj, self))
-                except Exception as e:
-                    logging.warning(e)
+            # Only the declinations that can ever reach min_alt from this
+            # latitude are scanned. The selection comes brightest first, and
+            # the limit is applied after the window filter, so that it keeps
+            # the best objects inside the window:
+            min_dec, max_dec = self.declination_range()
+            with self.timer.phase('catalog_query') as phase:
+                selection = get_dso_list(catalog=only_from_catalog,
+                                          kind=only_kind,
+                                          constellation=constellation,
+                                          uptovmag=min_apparent_mag,
+                                          min_dec=min_dec,
+                                          max_dec=max_dec,
+                                          snapshot=self.catalog,
+                                          )
+                phase.objects = len(selection)
+
+            inside = self.select_inside_window(selection)
+            selection_filtered = selection[np.isin(selection, inside)][0:self.limit]
+
+            with self.timer.phase('observer_construction', len(selection_filtered)):
+                for obj in selection_filtered:
+                    try:
+                        self.deepspace_selection.append(DeepSpaceObserver(obj, self))
+                    except Exception as e:
+                        logging.warning(e)
+            self.update_deepspace_positions()
             logging.debug("=== Updating current positions for solar system objects")  # DEBUG
             self.update_now_solar_objects()
             logging.debug("=== Updating current positions for deep space objects")  # DEBUG
             self.update_now_deepspace_objects()
 
+    def iter_visible(self, batch_size=STREAM_BATCH_SIZE):
+        """ Yield the objects that are visible now, as soon as each batch of
+        them is computed: Solar System objects first, then the deep space
+        objects (with their score set), brightest first.
+
+        The catalog is walked in magnitude order, batch_size rows at a time,
+        and each batch goes through the session filters, the alt/az window
+        and one batched position update, so the first results do not wait
+        for the rest of the catalog. The session lists (deepspace_selection,
+        objects_visible_now, objects_not_visible) are filled as the
+        iteration goes, and are complete once it ends.
+        """
+        for group in (self.objects_visible_now, self.objects_not_visible, self.objects_not_defined):
+            group.planets, group.deepspace = [], []
+        if not self.solar_system:
+            names = SOLAR_SYSTEM
+            if self.only_these_sources is not None and self.only_these_sources.planets:
+                names = self.only_these_sources.planets
+            with self.timer.phase('observer_construction', len(names)):
+                self.solar_system = [PlanetObserver(name, self) for name in names]
+        self.update_now_solar_objects()
+        yield from self.objects_visible_now.planets
+
+        self.deepspace_selection = []
+        context = RankingContext(self, bookmarks=self.bookmarks)
+        now = self.now()
+        for batch in self._iter_deepspace_batches(batch_size):
+            with self.timer.phase('coordinate_update', len(batch)):
+                DeepSpacePositions.from_observers(batch)
+                alt, az = self.deepspace_altaz(batch, now)
+            with self.timer.phase('ranking', len(batch)):
+                rows = np.array([obj.catalog_index for obj in batch], dtype=int)
+                scores = np.nan_to_num(score_rows(self.catalog, rows, context), nan=0.0)
+            visible = []
+            with self.timer.phase('classification', len(batch)):
+                for obj, obj_alt, obj_az, score in zip(batch, alt, az, scores):
+                    obj.set_coords(obj_alt, obj_az)
+                    obj.score = float(score)
+                    if obj.is_up_now():
+                        visible.append(obj)
+                    else:
+                        self.objects_not_visible.deepspace.append(obj)
+            self.deepspace_selection.extend(batch)
+            self.objects_visible_now.deepspace.extend(visible)
+            yield from visible
+
+        # One position engine for the whole selection, as in the eager path:
+        self.deepspace_positions = DeepSpacePositions.from_observers(self.deepspace_selection)
+        self.deepspace_events = {}
+        self.visibility = None
+        self.moon_constraints = None
+
+    def _iter_deepspace_batches(self, batch_size):
+        """Lists of new DeepSpaceObserver objects for iter_visible, up to the session limit."""
+        if self.only_these_sources is not None:
+            names = self.only_these_sources.deepspace or []
+            for first in range(0, len(names), batch_size):
+                batch = []
+                with self.timer.phase('observer_construction') as phase:
+                    for obj_id in names[first:first + batch_size]:
+                        try:
+                            batch.append(DeepSpaceObserver(obj_id, self))
+                        except ValueError as e:
+                            logging.warning(e)
+                    phase.objects = len(batch)
+                if batch:
+                    yield batch
+            return
+
+        min_dec, max_dec = self.declination_range()
+        order = self.catalog.indexes['order_vmag']
+        remaining = self.limit
+        for first in range(0, len(order), batch_size):
+            with self.timer.phase('catalog_query') as phase:
+                rows = get_dso_list(catalog=self.using_catalogs or None,
+                                    kind=self.only_kind,
+                                    constellation=self.constellation,
+                                    uptovmag=self.min_apparent_mag,
+                                    min_dec=min_dec,
+                                    max_dec=max_dec,
+                                    snapshot=self.catalog,
+                                    subset=order[first:first + batch_size])
+                phase.objects = len(rows)
+            rows = rows[np.isin(rows, self.select_inside_window(rows))][0:remaining]
+            if len(rows):
+                with self.timer.phase('observer_construction', len(rows)):
+                    batch = [DeepSpaceObserver(row, self) for row in rows]
+                yield batch
+            if remaining is not None:
+                remaining -= len(rows)
+                if remaining <= 0:
+                    return
+
+    def declination_range(self):
+        """ Range of declinations (in degrees) that can rise above min_alt
+        from the session latitude, at some time of the day. It is geometric,
+        for catalog (J2000) declinations, so it is widened by WINDOW_MARGIN
+        (refraction, precession...), and the exact alt/az tests decide."""
+        reach = 90.0 - self.min_alt + WINDOW_MARGIN
+        return max(self.latitude - reach, -90.0), min(self.latitude + reach, 90.0)
+
+    def select_inside_window(self, selection, moment=None):
+        """ Keep only the catalog objects (given as row indices) that are
+        inside this session's alt/az window at the given moment (by default,
+        the session moment)."""
+        moment = moment if moment is not None else self.moment
+        with self.timer.phase('window_filter', len(selection)):
+            if self.stored_index(selection, moment.tt) is not None:
+                return self.store.inside_window(selection, moment, self.min_alt, self.max_alt,
+                                                self.min_az, self.max_az, self.altitude)
+            return get_sky_index(self.catalog).query_altaz(self.here, moment, self.longitude, self.latitude,
+                                                           self.min_alt, self.max_alt, self.min_az, self.max_az,
+                                                           subset=selection)
+
+    def stored_index(self, rows, start_jd, end_jd=None):
+        """ Columns of the given catalog rows in the session visibility
+        store, if there is one covering the time range (TT Julian dates) and
+        all the rows, or else None."""
+        if self.store is None or not len(rows) or not self.store.covers(start_jd, end_jd):
+            return None
+        return self.store.store_index(rows)
+
+    def deepspace_altaz(self, observers, t):
+        """ Alt/az (degrees) at time t for deep space observers that share
+        one position engine (in its order), from the visibility store when
+        possible, or else computed in one batched call."""
+        if not observers:
+            return np.empty(0), np.empty(0)
+        index = self.stored_index([obj.catalog_index for obj in observers], t.tt)
+        if index is not None:
+            return self.store.altaz(index, t, self.altitude)
+        return observers[0].positions.update(self.here, t)
+
     def log_visible(self):
         print(len(self.objects_visible_now.planets), "visible solar system objects:")
         for obj in self.objects_visible_now.planets:
@@ -250,37 +402,290 @@ class Session:
         values that depend on the user location."""
         self.latitude = latitude
         self.longitude = longitude
-        self.here = self.earth + Topos(f'{self.latitude} N', f'{self.longitude} E')
+        self.invalidate_observer_cache()
+        self.here = ObserverCache(self.earth + Topos(latitude=f'{self.latitude} N',
+                                                     longitude=f'{self.longitude} E',
+                                                     elevation_m=self.altitude))
+        self.store = (get_store(self.latitude, self.longitude, self.catalog, getattr(self.planets, 'path', None))
+                      if self.use_store else None)
+        self.solar_system_events = {}
+        self.solar_system_tables = {}
+        self.deepspace_events = {}
+        self.other_deepspace_events = {}
         # TODO: update anything that depends on the user location
 
+    def now(self):
+        """Current time for this session, from its clock, as a skyfield Time."""
+        return self.clock.now(self.ts)
+
+    def time_lapse(self, start=None, end=None, step_minutes=TIME_LAPSE_STEP_MINUTES, objects=None):
+        """ Replay the sky from start to end (by default, the session ones)
+        at regular steps, for the given objects (by default, the Solar System
+        objects and the deep space selection).
+
+        All the instants are computed at once, in a single batched call (see
+        visibility.compute_altaz), and then yielded as frames: a
+        SimpleNamespace(time, alt, az, inside, objects) per step, where alt/az
+        (degrees) and inside (within the session alt/az window) are arrays
+        following objects. The session clock is left alone.
+        """
+        start = start if start is not None else self.start
+        end = end if end is not None else self.end
+        if objects is None:
+            planets, deepspace = self.solar_system, self.deepspace_selection
+            positions = self.deepspace_positions
+        else:
+            planets = [obj for obj in objects if not hasattr(obj, 'ra_hours')]
+            deepspace = [obj for obj in objects if hasattr(obj, 'ra_hours')]
+            positions = None
+        objects = planets + deepspace
+
+        step = step_minutes / 1440.0
+        times = self.ts.tt_jd(start.tt + np.arange(int((end.tt - start.tt) / step + 1e-9) + 1) * step)
+        with self.timer.phase('time_lapse', len(objects) * len(times.tt)):
+            alt, az = compute_altaz(self, planets, deepspace, times, positions)
+            inside = is_inside_altaz_window(alt, az, self.min_alt, self.max_alt, self.min_az, self.max_az)
+        for column in range(len(times.tt)):
+            yield SimpleNamespace(time=times[column], alt=alt[:, column], az=az[:, column],
+                                  inside=inside[:, column], objects=objects)
+
+    def observer_at(self, t):
+        """ Barycentric position of the observer at time t (a skyfield Time,
+        scalar or array), computed once per instant and shared by all the
+        session objects, along with the frame matrices of its Time."""
+        return self.here.at(t)
+
+    def invalidate_observer_cache(self):
+        """ Forget the cached observer states. Called when the location
+        changes; states are keyed by instant, so a new session time does not
+        need it, but it frees the ones that will not be used again."""
+        if hasattr(self, 'here'):
+            self.here.clear()
+
     def update_now_solar_objects(self):
         """ Update current coordinates and other properties for all visible objects """
         self.objects_visible_now.planets = []
         self.objects_not_visible.planets = []
         self.objects_not_defined.planets = []
-        for obj in self.solar_system:
-            obj.update_coords()
-            if obj.is_up_now():
-                self.objects_visible_now.planets.append(obj)
-            else:
-                self.objects_not_visible.planets.append(obj)
-
-    def get_next_sunset():
-        pass
-
-    def get_next_sunrise():
-        pass
+        now = self.now()
+        with self.timer.phase('coordinate_update', len(self.solar_system)):
+            for obj in self.solar_system:
+                obj.update_coords(now)
+        with self.timer.phase('classification', len(self.solar_system)):
+            for obj in self.solar_system:
+                if obj.is_up_now():
+                    self.objects_visible_now.planets.append(obj)
+                else:
+                    self.objects_not_visible.planets.append(obj)
+
+    def get_solar_system_events(self, name):
+        """ Rise/transit/set times between start and end for a Solar System
+        object. The first call computes them for all the SOLAR_SYSTEM bodies
+        at once, and later calls reuse these results.
+        """
+        if name not in self.solar_system_events:
+            names = [n for n in SOLAR_SYSTEM if n not in self.solar_system_events]
+            names += [name] if name not in names else []
+            self.solar_system_events.update(find_solar_system_events(self.ts, self.here, self.planets, names,
+                                                                     self.start, self.end, self.longitude))
+        return self.solar_system_events[name]
+
+    def get_solar_system_table(self, name):
+        """ Chebyshev interpolation table for a Solar System object, covering
+        the session from start to end (see interpolation.ChebyshevTable). The
+        first call fits the tables for all the SOLAR_SYSTEM bodies at once.
+        """
+        if name not in self.solar_system_tables:
+            names = [n for n in SOLAR_SYSTEM if n not in self.solar_system_tables]
+            names += [name] if name not in names else []
+            self.solar_system_tables.update(fit_chebyshev_tables(self.ts, self.here, self.planets, names,
+                                                                 self.start, self.end))
+        return self.solar_system_tables[name]
+
+    def compute_deepspace_events(self, rows, horizon=0.0, refraction=True):
+        """ Rise/transit/set times between start and end for the given
+        catalog rows, as (objects × events) arrays of Julian dates (see
+        events.fixed_object_events), from the visibility store if it covers
+        them, or else computed in one batched call."""
+        index = self.stored_index(rows, self.start.tt, self.end.tt) if (horizon, refraction) == (0.0, True) else None
+        with self.timer.phase('events', len(rows)):
+            if index is not None:
+                return self.store.events(index, self.start, self.end)
+            positions = DeepSpacePositions(self.catalog.ra_hours[rows], self.catalog.dec_degrees[rows])
+            ra, dec = positions.radec_of_date(self.here, self.start)
+            return fixed_object_events(ra, dec, self.latitude, self.longitude, self.start, self.end,
+                                       horizon, refraction)
+
+    def get_deepspace_events(self, horizon=0.0, refraction=True):
+        """ Rise/transit/set times between start and end for the whole deep
+        space selection (see compute_deepspace_events). Rows follow the
+        selection order; see get_object_events for a single object.
+        """
+        key = (horizon, refraction)
+        if key not in self.deepspace_events:
+            rows = np.array([obj.catalog_index for obj in self.deepspace_selection], dtype=int)
+            events = self.compute_deepspace_events(rows, horizon, refraction)
+            events.row_of = {row: i for i, row in enumerate(rows.tolist())}
+            self.deepspace_events[key] = events
+        return self.deepspace_events[key]
+
+    def get_object_events(self, obj, horizon=0.0, refraction=True):
+        """ Rise/transit/set times of one deep space object, as the row of
+        get_deepspace_events for its catalog row (not its position engine
+        row, as objects may come from another engine, e.g. from best()), or
+        computed for it alone (and kept) if it is not in the selection."""
+        events = self.get_deepspace_events(horizon, refraction)
+        row = events.row_of.get(obj.catalog_index)
+        if row is None:
+            key = (obj.catalog_index, horizon, refraction)
+            if key not in self.other_deepspace_events:
+                self.other_deepspace_events[key] = self.compute_deepspace_events(
+                    np.array([obj.catalog_index]), horizon, refraction)
+            events, row = self.other_deepspace_events[key], 0
+        return SimpleNamespace(**{name: values[row] for name, values in vars(events).items() if name != 'row_of'})
+
+    def compute_visibility(self, step_minutes=VISIBILITY_STEP_MINUTES):
+        """ Compute (and keep, as self.visibility) the altitude/azimuth matrix
+        of all the session objects from start to end, with the given time
+        resolution. See visibility.VisibilityMatrix for the queries it answers.
+        """
+        with self.timer.phase('visibility', len(self.solar_system) + len(self.deepspace_selection)):
+            self.visibility = compute_visibility(self, step_minutes)
+        self.moon_constraints = None
+        return self.visibility
+
+    def compute_moon_constraints(self):
+        """ Compute (and keep, as self.moon_constraints) the Moon altitude,
+        illuminated fraction, separation and moonlight penalty over the
+        visibility matrix time grid (computing the matrix first if needed).
+        Once available, they are also applied by generate_session_list and by
+        each object's will_be_visible_during_session.
+        """
+        if self.visibility is None:
+            self.compute_visibility()
+        self.moon_constraints = compute_moon_constraints(self, self.visibility, self.min_alt)
+        return self.moon_constraints
+
+    def score_selection(self):
+        """ Score the current deep space selection (see ranking.score_rows),
+        setting each object's score, and return it sorted best first."""
+        with self.timer.phase('ranking', len(self.deepspace_selection)):
+            context = RankingContext(self, bookmarks=self.bookmarks)
+            rows = np.array([obj.catalog_index for obj in self.deepspace_selection], dtype=int)
+            scores = np.nan_to_num(score_rows(self.catalog, rows, context), nan=0.0)
+        for obj, score in zip(self.deepspace_selection, scores):
+            obj.score = float(score)
+        return sorted(self.deepspace_selection, key=lambda obj: obj.score, reverse=True)
+
+    def best(self, k=50):
+        """ The k best deep space objects for this session, from the whole
+        catalog (with the session filters), best first. The catalog is
+        streamed in chunks, and observer objects are only created for the
+        selected ones, with their score set.
+        """
+        context = RankingContext(self, bookmarks=self.bookmarks)
+        min_dec, max_dec = self.declination_range()
+        chunks = (get_dso_list(catalog=self.using_catalogs or None,
+                               kind=self.only_kind,
+                               constellation=self.constellation,
+                               uptovmag=self.min_apparent_mag,
+                               min_dec=min_dec,
+                               max_dec=max_dec,
+                               snapshot=self.catalog,
+                               subset=rows)
+                  for rows in row_chunks(len(self.catalog)))
+        with self.timer.phase('ranking', len(self.catalog)):
+            ranked = top_k(self.catalog, context, k, chunks)
+        best = []
+        with self.timer.phase('observer_construction', len(ranked)):
+            for score, row in ranked:
+                obj = DeepSpaceObserver(row, self)
+                obj.score = score
+                best.append(obj)
+            DeepSpacePositions.from_observers(best)
+        return best
+
+    def plan(self, objects=None, **kwargs):
+        """ Timed observing plan for the given objects (by default, the deep
+        space selection), taken from the session visibility matrix, which is
+        computed first if needed. Objects are scored first if none of them
+        has a score yet. See scheduler.plan_session for the options.
+        """
+        objects = objects if objects is not None else self.deepspace_selection
+        if self.visibility is None:
+            self.compute_visibility()
+        if not any(obj.score for obj in objects):
+            self.score_selection()
+        return plan_session(self, objects, **kwargs)
+
+    def live(self, objects=None, drift_seconds=LIVE_DRIFT_SECONDS):
+        """ A live.LiveSky for the given objects (by default, the Solar System
+        objects and the deep space selection): call its tick() to refresh
+        their alt/az, recomputing the apparent positions only once per drift
+        interval."""
+        return LiveSky(self, objects, drift_seconds)
+
+    def get_next_sunset(self, twilight=SESSION_TWILIGHT):
+        """ Start of the dark window (Sun below the twilight altitude, see
+        events.TWILIGHTS) that is going on at the session moment, or of the
+        next one. Returns None if there is no night ahead (polar summer).
+        """
+        dusk, _ = next_dark_window(self.ts, self.planets, self.latitude, self.longitude, self.moment, twilight)
+        return self.ts.tt_jd(dusk) if dusk is not None else None
+
+    def get_next_sunrise(self, after=None, twilight=SESSION_TWILIGHT):
+        """ End of the dark window that is going on at the given time (by
+        default, the session moment), or of the next one. Returns None if
+        there is no such dawn.
+        """
+        after = after if after is not None else self.moment
+        _, dawn = next_dark_window(self.ts, self.planets, self.latitude, self.longitude, after, twilight)
+        return self.ts.tt_jd(dawn) if dawn is not None and not np.isnan(dawn) else None
+
+    def get_dark_windows(self, nights=1, start=None, twilight=SESSION_TWILIGHT):
+        """ Dusk and dawn times (TT Julian date arrays) for several consecutive
+        nights, from the night of start (by default, of the session start).
+        See events.dark_windows.
+        """
+        start = start if start is not None else self.start
+        return dark_windows(self.ts, self.planets, self.latitude, self.longitude, start, nights, twilight)
 
     def generate_session_list(self):
         self.objects_visible_during_session.planets = []
         self.objects_not_visible_during_session.planets = []
         self.objects_not_defined_during_session.planets = []
-        for obj in self.solar_system:
-            obj.calculate_rise_and_set()
-            if obj.will_be_visible_during_session():
-                self.objects_visible_during_session.planets.append(obj)
-            else:
-                self.objects_not_visible.planets.append(obj)
+        with self.timer.phase('classification', len(self.solar_system)):
+            for obj in self.solar_system:
+                obj.calculate_rise_and_set()
+                if obj.will_be_visible_during_session():
+                    self.objects_visible_during_session.planets.append(obj)
+                else:
+                    self.objects_not_visible_during_session.planets.append(obj)
+
+        self.objects_visible_during_session.deepspace = []
+        self.objects_not_visible_during_session.deepspace = []
+        self.objects_not_defined_during_session.deepspace = []
+        up_during_session = self.get_deepspace_events().up_during_session
+        if self.moon_constraints is not None:
+            up_during_session = up_during_session & self.moon_constraints.allowed[len(self.solar_system):]
+        with self.timer.phase('classification', len(self.deepspace_selection)):
+            for obj, is_up in zip(self.deepspace_selection, up_during_session):
+                if is_up:
+                    self.objects_visible_during_session.deepspace.append(obj)
+                else:
+                    self.objects_not_visible_during_session.deepspace.append(obj)
+
+    def update_deepspace_positions(self):
+        """ (Re)build the batched position engine for the current deep space
+        selection, with initial alt/az values for the session start time."""
+        with self.timer.phase('coordinate_update', len(self.deepspace_selection)):
+            self.deepspace_positions = DeepSpacePositions.from_observers(self.deepspace_selection)
+            self.deepspace_events = {}
+            self.visibility = None
+            self.moon_constraints = None
+            alt, az = self.deepspace_altaz(self.deepspace_selection, self.start)
+            for obj, obj_alt, obj_az in zip(self.deepspace_selection, alt, az):
+                obj.set_coords(obj_alt, obj_az)
 
     def update_now_deepspace_objects(self):
         """ Update current coordinates and other properties for all visible objects """
@@ -289,15 +694,26 @@ class Session:
         self.objects_not_visible.deepspace = []
         self.objects_not_defined.deepspace = []
 
-        for obj in self.deepspace_selection:
-            try:
-                obj.update_coords()
+        with self.timer.phase('coordinate_update', len(self.deepspace_selection)):
+            alt, az = self.deepspace_altaz(self.deepspace_selection, self.now())
+        with self.timer.phase('classification', len(self.deepspace_selection)):
+            for obj, obj_alt, obj_az in zip(self.deepspace_selection, alt, az):
+                obj.set_coords(obj_alt, obj_az)
                 if obj.is_up_now():
                     self.objects_visible_now.deepspace.append(obj)
                 else:
                     self.objects_not_visible.deepspace.append(obj)
-            except ValueError as e:
-                logging.warning(e)
+
+    @property
+    def timings(self):
+        """ Wall time, calls and objects per phase (catalog_query,
+        window_filter, observer_construction, coordinate_update,
+        classification, ...) since the session was created, as a JSON-ready
+        dict. Phases are only timed when the session has instrument=True."""
+        return self.timer.report()
+
+    def write_timings(self, path):
+        self.timer.write_json(path)
 
     def __repr__(self):
         cls_name = self.__class__.__name__
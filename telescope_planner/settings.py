@@ -1,6 +1,29 @@
 #!/usr/bin/env python3
 
 DATA_FOLDER = '~/Documents/telescope-planner-data'
+EPHEMERIS_FILE = 'de421.bsp'
 
 DEFAULT_MIN_MAG = 14.5
-NAKED_EYE_MAG = 6.0
\ No newline at end of file
+NAKED_EYE_MAG = 6.0
+
+# Default session start/end, when not given: 'sunset', 'civil', 'nautical' or
+# 'astronomical' twilight (see events.TWILIGHTS):
+SESSION_TWILIGHT = 'sunset'
+
+# Catalog rows processed per batch by Session.iter_visible():
+STREAM_BATCH_SIZE = 512
+
+# Time resolution for the session visibility matrix:
+VISIBILITY_STEP_MINUTES = 10
+
+# Time between frames for Session.time_lapse():
+TIME_LAPSE_STEP_MINUTES = 1
+
+# Where the CLI writes its per-phase timings (see Session.timings), as JSON.
+# None to only log them:
+TIMINGS_FILE = None
+
+CATALOG_FOLDER = DATA_FOLDER + '/ongc-snapshot'
+
+# Precomputed visibility stores, one folder per site (see store.py):
+STORE_FOLDER = DATA_FOLDER + '/visibility-store'
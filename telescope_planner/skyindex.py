@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from skyfield.api import Star
+
+from telescope_planner.skymath import hadec_to_altaz, is_inside_altaz_window, local_sidereal_degrees
+
+# Catalog coordinates are J2000, while the window is tested against the sky
+# of date. This margin (in degrees) covers precession for a few decades,
+# aberration, nutation and refraction, so that the pixel pass never drops an
+# object that the exact pass would keep.
+WINDOW_MARGIN = 1.0
+
+
+class SkyIndex:
+    """ Spatial index over a set of fixed RA/Dec positions.
+
+    The sky is split in declination bands of equal width, and each band in
+    right ascension cells of roughly the same angular size (HEALPix-style,
+    iso-latitude pixels). Objects are stored sorted by pixel, so that an alt/az
+    window query only transforms the pixel centers, and then runs an exact
+    test for the objects in the pixels that touch the window.
+    """
+
+    def __init__(self, ra_hours, dec_degrees, pixel_degrees=5.0):
+        ra = np.asarray(ra_hours, dtype=float) * 15.0
+        dec = np.asarray(dec_degrees, dtype=float)
+        self.ra_hours = np.asarray(ra_hours, dtype=float)
+        self.dec_degrees = dec
+
+        n_bands = int(np.ceil(180.0 / pixel_degrees))
+        band_height = 180.0 / n_bands
+        band_centers = -90.0 + (np.arange(n_bands) + 0.5) * band_height
+        cells = np.maximum(1, np.round(360.0 * np.cos(np.radians(band_centers)) / pixel_degrees)).astype(int)
+        first_pixel = np.concatenate([[0], np.cumsum(cells)])
+
+        self.pixel_dec = np.repeat(band_centers, cells)
+        cell_number = np.arange(first_pixel[-1]) - np.repeat(first_pixel[:-1], cells)
+        cell_width = np.repeat(360.0 / cells, cells)
+        self.pixel_ra = (cell_number + 0.5) * cell_width
+
+        # Circumradius of each pixel (half diagonal, measured on the band edge
+        # closest to the equator):
+        widest = np.cos(np.radians(np.maximum(np.abs(self.pixel_dec) - band_height / 2, 0.0)))
+        self.pixel_radius = 0.5 * np.hypot(band_height, cell_width * widest)
+
+        valid = ~(np.isnan(ra) | np.isnan(dec))
+        band = np.clip(((dec[valid] + 90.0) / band_height).astype(int), 0, n_bands - 1)
+        cell = np.minimum((ra[valid] % 360.0 / (360.0 / cells[band])).astype(int), cells[band] - 1)
+        pixel = first_pixel[band] + cell
+
+        order = np.argsort(pixel, kind='stable')
+        self.objects = np.flatnonzero(valid)[order]
+        self.pixel_start = np.searchsorted(pixel[order], np.arange(first_pixel[-1] + 1))
+
+    def __len__(self):
+        return len(self.objects)
+
+    def candidates(self, lst_degrees, latitude, min_alt=0.0, max_alt=90.0, min_az=0.0, max_az=360.0,
+                   margin=WINDOW_MARGIN):
+        """ Indices of the objects in the pixels touching the given alt/az
+        window, for a local sidereal time and latitude (a superset of the
+        objects actually inside it).
+        """
+        alt, az = hadec_to_altaz(lst_degrees - self.pixel_ra, self.pixel_dec, latitude)
+        radius = self.pixel_radius + margin
+
+        near = (alt + radius >= min_alt) & (alt - radius <= max_alt)
+        if max_az - min_az < 360.0:
+            # Azimuth tolerance grows towards the zenith, where all azimuths meet:
+            reaches_zenith = np.abs(alt) + radius >= 90.0
+            ratio = np.sin(np.radians(radius)) / np.cos(np.radians(np.where(reaches_zenith, 0.0, alt)))
+            az_radius = np.where(reaches_zenith, 180.0, np.degrees(np.arcsin(np.minimum(ratio, 1.0))))
+            center = ((min_az % 360.0) + ((max_az - min_az) % 360.0) / 2) % 360.0
+            half_width = ((max_az - min_az) % 360.0) / 2
+            distance = np.abs((az - center + 180.0) % 360.0 - 180.0)
+            near &= distance <= half_width + az_radius
+
+        pixels = np.flatnonzero(near)
+        starts, stops = self.pixel_start[pixels], self.pixel_start[pixels + 1]
+        lengths = stops - starts
+        if not lengths.sum():
+            return np.empty(0, dtype=int)
+        offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        return np.sort(self.objects[np.arange(lengths.sum()) + offsets])
+
+    def query_altaz(self, here, t, longitude, latitude, min_alt=0.0, max_alt=90.0, min_az=0.0, max_az=360.0,
+                    subset=None):
+        """ Which objects fall inside this alt/az window at time t?
+
+        The pixel pass keeps the candidates, and these are then checked with
+        their exact apparent alt/az (including refraction), computed by
+        skyfield in one batched call. If subset is given, only these object
+        indices are considered. Returns a sorted array of object indices.
+        """
+        candidates = self.candidates(local_sidereal_degrees(t, longitude), latitude,
+                                     min_alt, max_alt, min_az, max_az)
+        if subset is not None:
+            candidates = np.intersect1d(candidates, subset, assume_unique=True)
+        if not len(candidates):
+            return candidates
+
+        star = Star(ra_hours=self.ra_hours[candidates], dec_degrees=self.dec_degrees[candidates])
+        alt, az, _ = here.at(t).observe(star).apparent().altaz('standard')
+        return candidates[is_inside_altaz_window(alt.degrees, az.degrees, min_alt, max_alt, min_az, max_az)]
+
+
+_indexes = {}
+
+
+def get_sky_index(catalog):
+    """Return a SkyIndex for a catalog snapshot, built once per process."""
+    if catalog.folder not in _indexes:
+        _indexes[catalog.folder] = SkyIndex(catalog.ra_hours, catalog.dec_degrees)
+    return _indexes[catalog.folder]
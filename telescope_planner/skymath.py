@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Small vectorized spherical astronomy helpers, working on NumPy arrays of
+angles in degrees (or hours, where stated).
+"""
+import numpy as np
+
+
+def unit_vectors(ra_degrees, dec_degrees):
+    """Cartesian unit vectors (..., 3) for the given equatorial coordinates."""
+    ra, dec = np.radians(ra_degrees), np.radians(dec_degrees)
+    cos_dec = np.cos(dec)
+    return np.stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+def local_sidereal_degrees(t, longitude):
+    """Local apparent sidereal time, in degrees, for a skyfield Time (scalar
+    or array) and an east longitude in degrees."""
+    return (np.asarray(t.gast) * 15.0 + longitude) % 360.0
+
+
+def hadec_to_altaz(ha_degrees, dec_degrees, latitude):
+    """ Convert hour angle/declination to geometric altitude/azimuth (azimuth
+    measured from North through East), all in degrees.
+    """
+    ha, dec, lat = np.radians(ha_degrees), np.radians(dec_degrees), np.radians(latitude)
+    sin_alt = np.sin(dec) * np.sin(lat) + np.cos(dec) * np.cos(lat) * np.cos(ha)
+    alt = np.arcsin(np.clip(sin_alt, -1.0, 1.0))
+    az = np.arctan2(-np.cos(dec) * np.sin(ha),
+                    np.sin(dec) * np.cos(lat) - np.cos(dec) * np.sin(lat) * np.cos(ha))
+    return np.degrees(alt), np.degrees(az) % 360.0
+
+
+def radec_to_altaz(ra_degrees, dec_degrees, lst_degrees, latitude):
+    """Equatorial coordinates of date to geometric altitude/azimuth, in degrees."""
+    return hadec_to_altaz(lst_degrees - ra_degrees, dec_degrees, latitude)
+
+
+def is_inside_altaz_window(alt, az, min_alt=0.0, max_alt=90.0, min_az=0.0, max_az=360.0):
+    """ Boolean mask for positions inside an alt/az window. When min_az is
+    greater than max_az, the window wraps around North (e.g. 300° to 60°).
+    """
+    alt, az = np.asarray(alt), np.asarray(az) % 360.0
+    inside = (alt >= min_alt) & (alt <= max_alt)
+    if max_az - min_az >= 360.0:
+        return inside
+    min_az, max_az = min_az % 360.0, max_az % 360.0
+    if min_az <= max_az:
+        return inside & (az >= min_az) & (az <= max_az)
+    return inside & ((az >= min_az) | (az <= max_az))
+
+
+def standard_pressure(elevation_m=0.0):
+    """ Atmospheric pressure (mbar) at an elevation (meters), as assumed by
+    skyfield's altaz('standard'): 1010 mbar at sea level."""
+    return 1010.0 * np.exp(-(elevation_m or 0.0) / 9100.0)
+
+
+def refraction_degrees(alt_degrees, temperature_C=10.0, pressure_mbar=1010.0):
+    """ Atmospheric refraction for an apparent altitude, in degrees (Bennett's
+    formula, as used by skyfield for its 'standard' conditions).
+    """
+    alt = np.asarray(alt_degrees)
+    r = 0.016667 / np.tan(np.radians(alt + 7.31 / (alt + 4.4)))
+    r = r * (0.28 * pressure_mbar / (temperature_C + 273.0))
+    return np.where((alt >= -1.0) & (alt <= 89.9), r, 0.0)
+
+
+def refract(alt_degrees, temperature_C=10.0, pressure_mbar=1010.0, iterations=6):
+    """Apparent (refracted) altitude for a geometric altitude, in degrees."""
+    alt_degrees = np.asarray(alt_degrees)
+    alt = alt_degrees
+    for _ in range(iterations):
+        alt = alt_degrees + refraction_degrees(alt, temperature_C, pressure_mbar)
+    return alt
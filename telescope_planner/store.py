@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Precomputed visibility store, one folder per observing site.
+
+A nightly job computes, for every object in the catalog snapshot, its
+apparent RA/Dec of date (as seen from the site, in the middle of the stored
+nights) and its rise, transit and set times over the coming nights, and
+writes them as plain NumPy files. Sessions for a stored site then memory-map
+them, so that "what is visible from here tonight / at time T" needs no
+ephemeris: alt/az at T are just the hour angle rotation of the stored RA/Dec,
+plus refraction for the session elevation (within 0.001° of the full skyfield
+computation, over the stored nights).
+
+Each store records the site (including the elevation it was computed for),
+the catalog snapshot and the ephemeris kernel (file name, size and
+modification time) it was computed from, and is ignored if either one of the
+last two has changed.
+
+To (re)build the stores for the configured sites (multisite.SITES):
+
+    python -m telescope_planner.store [--nights N]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+from types import SimpleNamespace
+
+import numpy as np
+
+from telescope_planner.events import REFRACTION_DEGREES, _quantize
+from telescope_planner.events import fixed_object_events, night_numbers
+from telescope_planner.settings import DATA_FOLDER, EPHEMERIS_FILE, STORE_FOLDER
+from telescope_planner.skymath import is_inside_altaz_window, local_sidereal_degrees, radec_to_altaz, refract
+from telescope_planner.skymath import standard_pressure
+
+STORE_FORMAT = 3
+
+STORE_NIGHTS = 3
+
+_stores = {}
+
+
+def catalog_version(catalog):
+    """The catalog snapshot fields a store depends on."""
+    return {key: catalog.meta.get(key) for key in ('format', 'pyongc_version', 'db_date', 'count')}
+
+
+def ephemeris_version(path=None):
+    """ The ephemeris kernel fields a store depends on, for the kernel file
+    at path (by default, the configured one)."""
+    path = path or os.path.join(os.path.expanduser(DATA_FOLDER), EPHEMERIS_FILE)
+    stat = os.stat(path)
+    return {'file': os.path.basename(path), 'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+
+def site_folder(latitude, longitude, folder=STORE_FOLDER):
+    """Store folder for a site, rounded like the dark window cache (see events.LOCATION_QUANTUM_DEGREES)."""
+    return os.path.join(os.path.expanduser(folder), f'site_{_quantize(latitude):+.2f}_{_quantize(longitude):+.2f}')
+
+
+def build_store(session, nights=STORE_NIGHTS, folder=STORE_FOLDER):
+    """ Compute and write the store for the session site, for the given
+    number of nights, starting at the local noon before the session start.
+    The session only provides the site, timescale, ephemeris and catalog.
+    Returns the store folder.
+    """
+    from telescope_planner.positions import DeepSpacePositions
+
+    ts, catalog = session.ts, session.catalog
+    first_night = int(night_numbers(session.start.tt, session.longitude))
+    start = ts.tt_jd(first_night - session.longitude / 360.0)
+    end = ts.tt_jd(start.tt + nights)
+
+    rows = np.sort(catalog.query()).astype(np.int32)
+    positions = DeepSpacePositions(catalog.ra_hours[rows], catalog.dec_degrees[rows])
+    ra, dec = positions.radec_of_date(session.here, ts.tt_jd((start.tt + end.tt) / 2))
+    events = fixed_object_events(ra, dec, session.latitude, session.longitude, start, end)
+
+    target = site_folder(session.latitude, session.longitude, folder)
+    partial = target + '.partial'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    arrays = {'rows': rows,
+              'ra_date': ra,
+              'dec_date': dec,
+              'rises': events.rises,
+              'transits': events.transits,
+              'sets': events.sets,
+              'always_up': events.always_up,
+              'never_up': events.never_up,
+              }
+    for name, values in arrays.items():
+        np.save(os.path.join(partial, f'{name}.npy'), np.ascontiguousarray(values))
+    meta = {'format': STORE_FORMAT,
+            'catalog': catalog_version(catalog),
+            'ephemeris': ephemeris_version(getattr(session.planets, 'path', None)),
+            'latitude': session.latitude,
+            'longitude': session.longitude,
+            'altitude': session.altitude,
+            'start': start.tt,
+            'end': end.tt,
+            'nights': nights,
+            'built': session.now().utc_iso(),
+            }
+    with open(os.path.join(partial, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+
+    # Swap the whole folder at once, so that readers never see a partial store:
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(partial, target)
+    _stores.pop(target, None)
+    logging.debug(f"Built visibility store for {nights} nights, {len(rows)} objects in {target}")
+    return target
+
+
+class VisibilityStore:
+    """ Read-only, memory-mapped view of a site store. Catalog rows are
+    mapped to store columns with store_index()."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        with open(os.path.join(folder, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get('format') != STORE_FORMAT:
+            raise ValueError(f'Unsupported visibility store format in {folder}')
+        for name in ('rows', 'ra_date', 'dec_date', 'rises', 'transits', 'sets', 'always_up', 'never_up'):
+            setattr(self, name, np.load(os.path.join(folder, f'{name}.npy'), mmap_mode='r'))
+        self.latitude, self.longitude = self.meta['latitude'], self.meta['longitude']
+        self.start, self.end = self.meta['start'], self.meta['end']
+
+    def is_valid_for(self, catalog, ephemeris_path=None):
+        """Was this store built from this catalog snapshot and ephemeris kernel file (see ephemeris_version)?"""
+        try:
+            ephemeris = ephemeris_version(ephemeris_path)
+        except OSError:
+            return False
+        return self.meta['catalog'] == catalog_version(catalog) and self.meta['ephemeris'] == ephemeris
+
+    def covers(self, start_jd, end_jd=None):
+        end_jd = end_jd if end_jd is not None else start_jd
+        return self.start <= start_jd and end_jd <= self.end
+
+    def store_index(self, rows):
+        """Store columns for catalog rows, or None if any of them is not stored."""
+        rows = np.asarray(rows, dtype=int)
+        index = np.minimum(np.searchsorted(self.rows, rows), len(self.rows) - 1)
+        if len(rows) and not np.array_equal(self.rows[index], rows):
+            return None
+        return index
+
+    def altaz(self, index, t, elevation_m=None):
+        """ Apparent alt/az (degrees) at time t (a skyfield Time) for the
+        given store columns, with standard refraction for the elevation (in
+        meters; by default, the store one)."""
+        elevation_m = elevation_m if elevation_m is not None else self.meta['altitude']
+        alt, az = radec_to_altaz(np.asarray(self.ra_date[index]) * 15.0, np.asarray(self.dec_date[index]),
+                                 local_sidereal_degrees(t, self.longitude), self.latitude)
+        return refract(alt, pressure_mbar=standard_pressure(elevation_m)), az
+
+    def inside_window(self, rows, t, min_alt=0.0, max_alt=90.0, min_az=0.0, max_az=360.0, elevation_m=None):
+        """Sorted catalog rows, among the given ones, inside an alt/az window at time t (see altaz)."""
+        rows = np.sort(np.asarray(rows, dtype=int))
+        index = self.store_index(rows)
+        alt, az = self.altaz(index, t, elevation_m)
+        return rows[is_inside_altaz_window(alt, az, min_alt, max_alt, min_az, max_az)]
+
+    def events(self, index, start, end):
+        """ Rise/transit/set times between start and end (skyfield Time
+        objects) for the given store columns, in the same form as
+        events.fixed_object_events (horizon 0, with refraction)."""
+        def between(values):
+            values = np.where((values >= start.tt) & (values <= end.tt), values, np.nan)
+            values = np.sort(values, axis=1)  # NaN values go last
+            return values[:, 0:max(int((~np.isnan(values)).sum(axis=1).max(initial=0)), 1)]
+
+        rises, sets, transits = (between(np.asarray(values[index])) for values in (self.rises, self.sets,
+                                                                                     self.transits))
+        always_up, never_up = np.asarray(self.always_up[index]), np.asarray(self.never_up[index])
+
+        lat, dec = np.radians(self.latitude), np.radians(np.asarray(self.dec_date[index]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_h0 = (np.sin(np.radians(-REFRACTION_DEGREES)) - np.sin(lat) * np.sin(dec)) / (np.cos(lat) * np.cos(dec))
+        semi_arc = np.degrees(np.arccos(np.clip(cos_h0, -1.0, 1.0)))
+        hour_angle = local_sidereal_degrees(start, self.longitude) - np.asarray(self.ra_date[index]) * 15.0
+        up_at_start = always_up | (~never_up & (np.abs((hour_angle + 180.0) % 360.0 - 180.0) <= semi_arc))
+        return SimpleNamespace(rises=rises, sets=sets, transits=transits, up_at_start=up_at_start,
+                               up_during_session=up_at_start | ~np.isnan(rises).all(axis=1),
+                               always_up=always_up, never_up=never_up)
+
+
+def get_store(latitude, longitude, catalog, ephemeris_path=None, folder=STORE_FOLDER):
+    """ The process-wide store for a site, or None if there is none, or if
+    it was built from another catalog snapshot or ephemeris kernel (by
+    default, the configured one). A store rebuilt on disk is opened again."""
+    path = site_folder(latitude, longitude, folder)
+    try:
+        stamp = os.stat(os.path.join(path, 'meta.json')).st_mtime_ns
+    except OSError:
+        return None
+    if path not in _stores or _stores[path][0] != stamp:
+        try:
+            _stores[path] = (stamp, VisibilityStore(path))
+        except (OSError, ValueError) as e:
+            logging.info(f"Ignoring visibility store in {path} ({e})")
+            return None
+    store = _stores[path][1]
+    return store if store.is_valid_for(catalog, ephemeris_path) else None
+
+
+def main(argv=None):
+    from telescope_planner.multisite import SITES
+    from telescope_planner.session import Session
+
+    parser = argparse.ArgumentParser(description='Build the visibility stores for the configured sites.')
+    parser.add_argument('--nights', type=int, default=STORE_NIGHTS)
+    args = parser.parse_args(argv)
+
+    for site in SITES:
+        session = Session(latitude=site.latitude, longitude=site.longitude, altitude=site.altitude or 0.0,
+                          stream=True, use_store=False)
+        print(f'{site.city}: {build_store(session, args.nights)}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from telescope_planner.events import time_grid
+from telescope_planner.positions import DeepSpacePositions
+from telescope_planner.skymath import local_sidereal_degrees, radec_to_altaz, refract, standard_pressure
+
+# Deep space objects are processed in blocks of rows, to bound the size of
+# the temporary float64 arrays on long sessions.
+ROWS_PER_BLOCK = 2048
+
+
+class VisibilityMatrix:
+    """ Altitude and azimuth (float32, in degrees) of every session object,
+    over a regular time grid from session start to end.
+
+    Rows follow the objects list (Solar System objects first, then the deep
+    space selection), and columns follow the times grid. Every question about
+    the session ("visible between 22:00 and 01:00", "above 30°", "best hour")
+    is answered from these arrays, without recomputing any ephemeris.
+    """
+
+    def __init__(self, objects, times, alt, az):
+        self.objects = objects
+        self.times = times
+        self.jd = np.atleast_1d(times.tt)
+        self.alt = alt
+        self.az = az
+        self.step_hours = float(np.diff(self.jd).mean() * 24) if len(self.jd) > 1 else 0.0
+        self._rows = {id(obj): row for row, obj in enumerate(objects)}
+
+    def __len__(self):
+        return len(self.objects)
+
+    def row(self, obj):
+        """Row of an object in the matrix, or None if it is not there."""
+        return self._rows.get(id(obj))
+
+    def columns(self, start=None, end=None):
+        """Boolean mask of the time steps between start and end (skyfield Time
+        objects, or None for the session limits)."""
+        mask = np.ones(len(self.jd), dtype=bool)
+        if start is not None:
+            mask &= self.jd >= start.tt
+        if end is not None:
+            mask &= self.jd <= end.tt
+        return mask
+
+    def is_above(self, min_alt=0.0, start=None, end=None):
+        """Which objects reach min_alt (degrees) at some time between start and end?"""
+        return (self.alt[:, self.columns(start, end)] >= min_alt).any(axis=1)
+
+    def hours_above(self, min_alt=0.0, start=None, end=None):
+        """How many hours does each object spend above min_alt between start and end?"""
+        return (self.alt[:, self.columns(start, end)] >= min_alt).sum(axis=1) * self.step_hours
+
+    def best_time(self, start=None, end=None):
+        """ Time step of highest altitude for each object, between start and end.
+        Returns the Julian dates (TT) and the altitudes at those times.
+        """
+        columns = np.flatnonzero(self.columns(start, end))
+        best = columns[np.argmax(self.alt[:, columns], axis=1)]
+        return self.jd[best], self.alt[np.arange(len(self)), best]
+
+    def select(self, mask):
+        """The objects for which mask (one value per row) is True."""
+        return [obj for obj, keep in zip(self.objects, mask) if keep]
+
+    def visible_between(self, start=None, end=None, min_alt=0.0):
+        return self.select(self.is_above(min_alt, start, end))
+
+
+def compute_altaz(session, planets, deepspace, times, positions=None):
+    """ Apparent altitude and azimuth (float32 arrays, in degrees) of the
+    given Solar System and deep space objects (rows, in that order) over a
+    skyfield Time array (columns), as seen from the session location. When
+    positions is given, deepspace only needs to have the same length (e.g.
+    an array of catalog rows).
+
+    Solar System objects take one vectorized skyfield call each, over the
+    whole time array. Deep space objects use their apparent RA/Dec of date at
+    the middle time (one batched call, from positions, if given, or else from
+    a new DeepSpacePositions engine) and the hour angle of each time step,
+    plus standard refraction for the site elevation, so that no further
+    ephemeris call is needed.
+    """
+    n_steps = len(np.atleast_1d(times.tt))
+    alt = np.empty((len(planets) + len(deepspace), n_steps), dtype=np.float32)
+    az = np.empty_like(alt)
+
+    observer = session.observer_at(times)
+    for row, obj in enumerate(planets):
+        obj_alt, obj_az, _ = observer.observe(obj.p).apparent().altaz('standard')
+        alt[row], az[row] = obj_alt.degrees, obj_az.degrees
+
+    if len(deepspace):
+        if positions is None:
+            positions = DeepSpacePositions([obj.ra_hours for obj in deepspace],
+                                           [obj.dec_degrees for obj in deepspace])
+        jd = np.atleast_1d(times.tt)
+        middle = session.ts.tt_jd((jd[0] + jd[-1]) / 2)
+        ra, dec = positions.radec_of_date(session.here, middle)
+        lst = local_sidereal_degrees(times, session.longitude)
+        pressure = standard_pressure(session.altitude)
+        for first in range(0, len(deepspace), ROWS_PER_BLOCK):
+            rows = slice(first, first + ROWS_PER_BLOCK)
+            block_alt, block_az = radec_to_altaz(ra[rows, np.newaxis] * 15.0, dec[rows, np.newaxis],
+                                                 lst, session.latitude)
+            out = slice(len(planets) + first, len(planets) + first + len(block_alt))
+            alt[out], az[out] = refract(block_alt, pressure_mbar=pressure), block_az
+
+    return alt, az
+
+
+def compute_visibility(session, step_minutes):
+    """ Build the VisibilityMatrix for a session, from start to end (see
+    compute_altaz)."""
+    times = time_grid(session.ts, session.start, session.end, step_minutes)
+    planets, deepspace = session.solar_system, session.deepspace_selection
+    alt, az = compute_altaz(session, planets, deepspace, times, session.deepspace_positions)
+    return VisibilityMatrix(planets + deepspace, times, alt, az)
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from telescope_planner.settings import DATA_FOLDER, EPHEMERIS_FILE
+
+# Tests need the ephemeris kernel already in the data folder (they never download it):
+if not os.path.exists(os.path.join(os.path.expanduser(DATA_FOLDER), EPHEMERIS_FILE)):
+    collect_ignore_glob = ['test_*.py']
+
+# A night in Braga (the default location), under a full Moon:
+NIGHT = (2026, 10, 25, 20), (2026, 10, 26, 5)
+
+
+@pytest.fixture(scope='session')
+def ts():
+    from telescope_planner.ephemeris import get_timescale
+    return get_timescale()
+
+
+@pytest.fixture(scope='session')
+def make_session(ts):
+    """ Session factory for the test night (unless start/end are given),
+    pinned to its start, and never reading the visibility stores."""
+    from telescope_planner.clock import FixedClock
+    from telescope_planner.session import Session
+
+    def make(**params):
+        params.setdefault('start', ts.utc(*NIGHT[0]))
+        params.setdefault('end', ts.utc(*NIGHT[1]))
+        params.setdefault('clock', FixedClock(params['start']))
+        return Session(timescale=ts, use_store=False, **params)
+
+    return make
+
+
+@pytest.fixture(scope='session')
+def session(make_session):
+    return make_session(limit=300)
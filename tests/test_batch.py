@@ -0,0 +1,25 @@
+import json
+import sys
+
+import pytest
+
+from telescope_planner.batch import run_spec
+
+
+@pytest.mark.parametrize('site', [{'latitude': 91, 'longitude': 0},
+                                  {'latitude': 41.5, 'longitude': -181},
+                                  {'longitude': 10}])
+def test_spec_with_a_bad_site_reports_an_error(site):
+    result = run_spec(dict(site, id='bad'))
+    assert result['id'] == 'bad'
+    assert result['error'].startswith('ValueError')
+
+
+def test_console_script_runs_batch(tmp_path, monkeypatch):
+    from telescope_planner.__main__ import main
+
+    specs, results = tmp_path / 'specs.jsonl', tmp_path / 'results.jsonl'
+    specs.write_text('{"id": "north", "latitude": 91, "longitude": 0}\n')
+    monkeypatch.setattr(sys, 'argv', ['telescope-planner', 'batch', str(specs), '-o', str(results)])
+    main()
+    assert json.loads(results.read_text())['id'] == 'north'
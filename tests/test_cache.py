@@ -0,0 +1,26 @@
+import pytest
+
+from telescope_planner.cache import SessionCache
+from telescope_planner.clock import FixedClock
+
+
+def test_quantize_uses_the_middle_of_the_altitude_band():
+    cache = SessionCache(altitude_band=250.0)
+    assert cache.quantize(41.55, -8.42, 0.0)[2] == 125.0
+    assert cache.quantize(41.55, -8.42, 249.0)[2] == 125.0
+    assert cache.quantize(41.55, -8.42, 1900.0)[2] == 1875.0
+
+
+def test_session_is_shared_inside_a_key(ts):
+    cache = SessionCache()
+    t = ts.utc(2026, 10, 25, 22)
+    session = cache.session(41.55, -8.42, 190.0, t, timescale=ts, limit=20, use_store=False)
+    nearby = ts.tt_jd(t.tt + 1.0 / 86400.0)
+    assert cache.session(41.56, -8.41, 200.0, nearby, timescale=ts, limit=20, use_store=False) is session
+    assert session.altitude == 125.0
+    assert cache.stats()['hits'] == 1
+
+
+def test_session_rejects_a_clock(ts):
+    with pytest.raises(ValueError):
+        SessionCache().session(41.55, -8.42, 190.0, ts.utc(2026, 10, 25, 22), timescale=ts, clock=FixedClock(0.0))
@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+
+import pytest
+
+from telescope_planner.constraints import MAX_MOON_PENALTY, MIN_MOON_TOLERANCE, moon_tolerance
+
+
+def test_faint_objects_stand_less_moonlight(session):
+    rows = [session.catalog.index_of(name) for name in ('NGC0869', 'NGC0891', 'IC0001')]
+    bright, faint, unknown = moon_tolerance(session.catalog, rows)
+    assert bright == MAX_MOON_PENALTY
+    assert MAX_MOON_PENALTY * MIN_MOON_TOLERANCE < faint < bright
+    assert unknown == pytest.approx(MAX_MOON_PENALTY * MIN_MOON_TOLERANCE)
+
+
+def test_full_moon_rejects_a_faint_galaxy(make_session):
+    sources = SimpleNamespace(planets=['moon'], deepspace=['NGC0224', 'NGC0891'])
+    session = make_session(only_these_sources=sources)
+    moon = session.compute_moon_constraints()
+    assert moon.illumination.max() > 0.99
+
+    andromeda, faint = session.deepspace_selection
+    row = session.visibility.row(faint)
+    up = session.visibility.alt[row] >= session.min_alt
+    assert moon.penalty[row][up].min() < MAX_MOON_PENALTY  # allowed by a fixed threshold
+    assert not faint.passes_moon_constraints()
+    assert andromeda.passes_moon_constraints()
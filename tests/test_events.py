@@ -0,0 +1,53 @@
+import numpy as np
+
+
+def event_dates(times):
+    return [t.tt for t in times]
+
+
+def selection_events(session, obj):
+    events = session.get_deepspace_events()
+    row = [other.catalog_index for other in session.deepspace_selection].index(obj.catalog_index)
+    return [[jd for jd in values[row] if not np.isnan(jd)] for values in (events.rises, events.sets, events.transits)]
+
+
+def test_best_objects_get_their_own_events(session):
+    best = session.best(30)
+    in_selection = {obj.catalog_index for obj in session.deepspace_selection}
+    assert any(obj.catalog_index in in_selection for obj in best)
+    for obj in best:
+        obj.calculate_rise_and_set()
+        if obj.catalog_index in in_selection:
+            expected = selection_events(session, obj)
+        else:
+            events = session.compute_deepspace_events(np.array([obj.catalog_index]))
+            expected = [[jd for jd in values[0] if not np.isnan(jd)]
+                        for values in (events.rises, events.sets, events.transits)]
+        assert [event_dates(obj.session_rises), event_dates(obj.session_sets),
+                event_dates(obj.session_transits)] == expected, obj
+
+
+def test_streamed_objects_get_their_own_events(make_session):
+    session = make_session(limit=300, stream=True)
+    deepspace = []
+    for obj in session.iter_visible(batch_size=64):
+        if hasattr(obj, 'catalog_index'):
+            obj.calculate_rise_and_set()  # while later batches are not there yet
+            deepspace.append(obj)
+    assert len(deepspace) > 64
+    for obj in deepspace:
+        assert [event_dates(obj.session_rises), event_dates(obj.session_sets),
+                event_dates(obj.session_transits)] == selection_events(session, obj), obj
+
+
+def test_dark_window_cache_is_bounded(session, ts, monkeypatch):
+    from telescope_planner import events
+
+    monkeypatch.setattr(events, '_dark_windows', events.OrderedDict())
+    monkeypatch.setattr(events, 'DARK_WINDOW_CACHE_SIZE', 5)
+    first = events.dark_windows(ts, session.planets, 41.55, -8.42, session.start, nights=2)
+    for latitude in (10.0, 20.0, 30.0, 40.0):
+        events.dark_windows(ts, session.planets, latitude, 0.0, session.start, nights=2)
+        assert len(events._dark_windows) <= 5
+    again = events.dark_windows(ts, session.planets, 41.55, -8.42, session.start, nights=2)
+    assert np.array_equal(first.dusk, again.dusk) and np.array_equal(first.dawn, again.dawn)
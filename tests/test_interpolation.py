@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from telescope_planner.constants import SOLAR_SYSTEM
+
+
+@pytest.mark.parametrize('altitude', [0.0, 190.0, 2400.0])
+def test_table_altaz_matches_skyfield(make_session, ts, altitude):
+    session = make_session(altitude=altitude, limit=1)
+    t = ts.tt_jd(np.linspace(session.start.tt, session.end.tt, 200))
+    observer = session.observer_at(t)
+    for obj in session.solar_system:
+        table = session.get_solar_system_table(obj.object_name)
+        alt, az, _ = table.altaz(t, session.latitude, session.longitude, session.altitude)
+        expected_alt, expected_az, _ = observer.observe(obj.p).apparent().altaz('standard')
+
+        error = np.abs(alt - expected_alt.degrees) * 3600.0
+        above = expected_alt.degrees > 1.0
+        assert error[above].max(initial=0.0) < 0.1, obj.object_name
+        assert error.max() < 1.0, obj.object_name
+        d_az = (az - expected_az.degrees + 180.0) % 360.0 - 180.0
+        assert np.abs(d_az * np.cos(expected_alt.radians)).max() * 3600.0 < 0.1, obj.object_name
+    assert len(session.solar_system) == len(SOLAR_SYSTEM)
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from skyfield.api import Star
+
+from telescope_planner.live import LiveSky
+
+
+@pytest.mark.parametrize('altitude', [0.0, 2400.0])
+def test_live_ticks_match_skyfield(make_session, ts, altitude):
+    session = make_session(altitude=altitude, limit=40)
+    live = LiveSky(session)
+    for seconds in (0.0, 90.0, 240.0, 299.0):
+        t = ts.tt_jd(session.start.tt + seconds / 86400.0)
+        alt, az = live.tick(t)
+
+        observer = session.observer_at(t)
+        for obj, obj_alt, obj_az in zip(live.objects, alt, az):
+            target = obj.p if hasattr(obj, 'p') else Star(ra_hours=obj.ra_hours, dec_degrees=obj.dec_degrees)
+            expected_alt, expected_az, _ = observer.observe(target).apparent().altaz('standard')
+            assert abs(obj_alt - expected_alt.degrees) * 3600.0 < 1.0, (obj, seconds)
+            d_az = (obj_az - expected_az.degrees + 180.0) % 360.0 - 180.0
+            assert abs(d_az * np.cos(expected_alt.radians)) * 3600.0 < 1.0, (obj, seconds)
+    assert live.refreshes == 1
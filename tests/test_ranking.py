@@ -0,0 +1,10 @@
+def test_best_of_none_is_empty(session):
+    assert session.best(0) == []
+    assert session.best(-1) == []
+
+
+def test_best_is_sorted_and_scored(session):
+    best = session.best(10)
+    assert len(best) == 10
+    scores = [obj.score for obj in best]
+    assert scores == sorted(scores, reverse=True)
@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+from telescope_planner.scheduler import OBSERVE_MINUTES
+
+
+def test_plan_waits_for_targets_that_rise_during_the_session(make_session, ts):
+    # The Leo galaxies only get above 10° late in the night, and M11 is already setting:
+    sources = SimpleNamespace(planets=['moon'], deepspace=['M11', 'M65', 'M66', 'M95'])
+    session = make_session(start=ts.utc(2026, 10, 25, 22), end=ts.utc(2026, 10, 26, 6), min_alt=10.0,
+                           only_these_sources=sources)
+    plan = session.plan()
+
+    assert len(plan) >= 3
+    assert plan[0].start.tt - session.start.tt > 3.0 / 24.0
+    previous_end = session.start.tt
+    for slot in plan:
+        assert slot.start.tt >= previous_end
+        assert slot.end.tt <= session.end.tt
+        assert abs((slot.end.tt - slot.start.tt) * 1440.0 - OBSERVE_MINUTES) < 1e-6
+        assert slot.alt >= session.min_alt
+        previous_end = slot.end.tt
+    assert len({slot.object.name for slot in plan}) == len(plan)
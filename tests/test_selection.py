@@ -0,0 +1,15 @@
+from telescope_planner.clock import FixedClock
+
+# Only refraction gets these galaxies above the horizon in Braga:
+GRAZING = {'NGC0087', 'NGC0088', 'NGC0089', 'NGC0092'}
+
+
+def test_grazing_objects_are_selected(make_session, ts):
+    moment = ts.utc(2026, 10, 25, 22, 45)
+    session = make_session(start=moment, clock=FixedClock(moment), stream=True)
+    streamed = {obj.name for obj in session.iter_visible() if hasattr(obj, 'catalog_index')}
+    assert GRAZING <= streamed
+    assert GRAZING <= {obj.name for obj in session.best(len(session.catalog))}
+    for obj in session.deepspace_selection:
+        if obj.name in GRAZING:
+            assert 0.0 < obj.alt.degrees < 1.0
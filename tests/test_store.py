@@ -0,0 +1,47 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from skyfield.api import Star
+
+from telescope_planner.store import build_store, get_store
+
+
+@pytest.fixture(scope='module')
+def store_folder(session, tmp_path_factory):
+    folder = tmp_path_factory.mktemp('visibility-store')
+    build_store(session, nights=1, folder=str(folder))
+    return str(folder)
+
+
+def test_store_is_valid_for_its_kernel(session, store_folder):
+    store = get_store(session.latitude, session.longitude, session.catalog, session.planets.path, store_folder)
+    assert store is not None
+    assert store.meta['ephemeris']['size'] == os.path.getsize(session.planets.path)
+
+
+def test_store_is_ignored_for_another_kernel_file(session, store_folder, tmp_path):
+    # Same name and size, but written later (e.g. a kernel downloaded again):
+    kernel = tmp_path / os.path.basename(session.planets.path)
+    shutil.copy(session.planets.path, kernel)
+    os.utime(kernel, (0, 0))
+    assert get_store(session.latitude, session.longitude, session.catalog, str(kernel), store_folder) is None
+
+
+@pytest.mark.parametrize('hours', [0.0, 10.0, 20.0])
+def test_store_altaz_matches_skyfield(session, store_folder, ts, hours):
+    store = get_store(session.latitude, session.longitude, session.catalog, session.planets.path, store_folder)
+    assert store.meta['altitude'] == session.altitude
+    t = ts.tt_jd(store.start + hours / 24.0)
+    index = np.arange(0, len(store.rows), 7)
+    rows = np.asarray(store.rows[index])
+    alt, az = store.altaz(index, t, session.altitude)
+
+    star = Star(ra_hours=session.catalog.ra_hours[rows], dec_degrees=session.catalog.dec_degrees[rows])
+    expected_alt, expected_az, _ = session.observer_at(t).observe(star).apparent().altaz('standard')
+    up = expected_alt.degrees > -1.0
+    assert np.abs(alt - expected_alt.degrees)[up].max() < 0.001
+    d_az = (az - expected_az.degrees + 180.0) % 360.0 - 180.0
+    assert np.abs(d_az * np.cos(expected_alt.radians))[up].max() < 0.001